@@ -0,0 +1,256 @@
+# apps/anomaly_detectors.py
+#
+# Anomaly detectors shared by the "SPC and LOF Analysis" page and the batch
+# job in precompute_anomalies.py, so stored flags and the page agree. Both
+# fill missing hours with fill_gaps() before detecting.
+#
+# SPC: a DCT high-pass along the time axis, with median/MAD bounds per
+# column. The transforms use one thread unless workers is given; the batch
+# job already runs one process per core.
+#
+# 1-D LOF: in one dimension the k nearest neighbours of a point are a
+# contiguous block of the sorted values, so they can be found with one sort
+# and a two-pointer sweep instead of a KD-tree. Neighbours are computed up
+# to the largest k offered on the page; any smaller k is a slice of them.
+#
+# When several neighbours are equally distant at the k-th place (common for
+# data rounded to 0.1), which of them count as neighbours is arbitrary. The
+# sweep always prefers the lower sorted position; sklearn's tree picks in
+# whatever order it visits them, and its own scores change when the rows
+# are reordered, or its brute-force search is used. On tied data the two
+# are therefore compared by how well they rank the points and how many
+# flagged hours they share, with sklearn's brute-force vs tree spread as
+# the yardstick, rather than exactly.
+#
+# Check the kernel against sklearn with:
+#   python apps/anomaly_detectors.py
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.fft import dct, idct
+from scipy.stats import spearmanr
+from sklearn.neighbors import LocalOutlierFactor
+
+
+MAX_LOF_NEIGHBORS = 50
+
+
+def fill_gaps(values):
+    """Missing values filled by linear interpolation, and the nearest value at the ends."""
+    return pd.DataFrame(values).interpolate(limit_direction="both").to_numpy(dtype=float).reshape(np.shape(values))
+
+
+# SPC ----------------------------------------------------------------------
+
+def dct_coefficients(X, workers=None):
+    """DCT of every column of X (time × series)."""
+    return dct(np.asarray(X, dtype=float), norm="ortho", axis=0, workers=workers)
+
+
+def spc_engine(X, freq_cutoff=100, num_std=3, coeffs=None, workers=None):
+    """
+    Robust SPC for every column of X (time × series) at once.
+
+    The DCT high-pass is applied along the time axis and median/MAD bounds
+    are computed per column. coeffs are dct_coefficients(X), if already
+    computed.
+
+    Returns:
+      A dict with the filtered signals "satv", per-column "median",
+      "robust_std", "upper_bound" and "lower_bound", and the outlier "mask".
+    """
+    X = np.asarray(X, dtype=float)
+    if coeffs is None:
+        coeffs = dct_coefficients(X, workers)
+
+    filtered = np.copy(coeffs)
+    filtered[:freq_cutoff] = 0
+    satv = idct(filtered, norm="ortho", axis=0, workers=workers)
+
+    # Robust stats per column
+    med = np.median(satv, axis=0)
+    mad = np.median(np.abs(satv - med), axis=0)
+    robust_std = mad * 1.4826
+
+    upper_bound = med + num_std * robust_std
+    lower_bound = med - num_std * robust_std
+
+    mask = (satv > upper_bound) | (satv < lower_bound)
+
+    return {
+        "satv": satv,
+        "median": med,
+        "robust_std": robust_std,
+        "upper_bound": upper_bound,
+        "lower_bound": lower_bound,
+        "mask": mask,
+    }
+
+
+# 1-D LOF ------------------------------------------------------------------
+
+def lof_1d_neighbours(values, max_neighbors=MAX_LOF_NEIGHBORS):
+    """
+    Nearest neighbours of every value, excluding the point itself.
+
+    Equally distant neighbours are ordered by sorted position, so ties
+    are broken the same way for every point.
+
+    Returns:
+      indices: (n, K) neighbour indices, nearest first
+      distances: (n, K) matching absolute distances
+    with K = min(max_neighbors + 1, n - 1). The extra neighbour shows
+    whether the k-th distance is tied.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    K = min(max_neighbors + 1, n - 1)
+
+    order = np.argsort(values, kind="stable")
+    xs = values[order]
+
+    # Two-pointer sweep: window [l, l + K] of K + 1 sorted points around i
+    left = np.empty(n, dtype=int)
+    l = 0
+    for i in range(n):
+        l = max(l, i - K)
+        while l + K + 1 < n and xs[l + K + 1] - xs[i] < xs[i] - xs[l]:
+            l += 1
+        left[i] = l
+
+    window = left[:, None] + np.arange(K + 1)[None, :]
+    # Drop the point itself from its window
+    not_self = window != np.arange(n)[:, None]
+    window = window[not_self].reshape(n, K)
+
+    dist = np.abs(xs[window] - xs[:, None])
+    nearest = np.argsort(dist, axis=1, kind="stable")
+    window = np.take_along_axis(window, nearest, axis=1)
+    dist = np.take_along_axis(dist, nearest, axis=1)
+
+    # Back from sorted positions to original positions
+    indices = np.empty_like(window)
+    distances = np.empty_like(dist)
+    indices[order] = order[window]
+    distances[order] = dist
+    return indices, distances
+
+
+def has_boundary_ties(distances, k):
+    """True if any point has another neighbour as far away as its k-th one."""
+    if k >= distances.shape[1]:
+        return False
+    return bool(np.any(np.isclose(distances[:, k], distances[:, k - 1], rtol=1e-9, atol=0)))
+
+
+def lof_1d_scores(values, n_neighbors=20, neighbours=None):
+    """
+    Negative local outlier factor of every value, as
+    LocalOutlierFactor(n_neighbors).fit(values.reshape(-1, 1)).negative_outlier_factor_.
+
+    neighbours is the output of lof_1d_neighbours(values), if already
+    computed. Equal on data without ties at the k-th neighbour; see the
+    module notes for tied data.
+    """
+    values = np.asarray(values, dtype=float)
+    if neighbours is None:
+        neighbours = lof_1d_neighbours(values, max(n_neighbors, MAX_LOF_NEIGHBORS))
+    indices, distances = neighbours
+    k = min(n_neighbors, len(values) - 1)
+
+    indices = indices[:, :k]
+    distances = distances[:, :k]
+
+    k_distance = distances[:, k - 1]
+    reach = np.maximum(distances, k_distance[indices])
+    lrd = 1.0 / (np.mean(reach, axis=1) + 1e-10)
+    return -np.mean(lrd[indices] / lrd[:, None], axis=1)
+
+
+def lof_1d_predict(negative_outlier_factor, contamination=0.01):
+    """Labels like LocalOutlierFactor.fit_predict: -1 for outliers, 1 otherwise."""
+    offset = np.percentile(negative_outlier_factor, 100.0 * contamination)
+    return np.where(negative_outlier_factor < offset, -1, 1)
+
+
+def lof_agreement(nof, nof_ref, contamination=0.01):
+    """
+    How closely two sets of negative outlier factors agree: largest score
+    difference, number of differing labels, share of flagged points in
+    common (intersection over union) and rank correlation.
+    """
+    flagged = lof_1d_predict(nof, contamination) == -1
+    flagged_ref = lof_1d_predict(nof_ref, contamination) == -1
+    union = np.sum(flagged | flagged_ref)
+
+    return {
+        "max_score_diff": float(np.max(np.abs(nof - nof_ref))),
+        "label_mismatches": int(np.sum(flagged != flagged_ref)),
+        "flagged_overlap": float(np.sum(flagged & flagged_ref) / union) if union else 1.0,
+        "rank_correlation": float(spearmanr(nof, nof_ref)[0]),
+    }
+
+
+def validate_lof_1d(values, n_neighbors=20, contamination=0.01):
+    """
+    Compare the 1-D kernel with sklearn on the same data.
+
+    Returns the lof_agreement of the two, whether the data has ties at the
+    k-th neighbour, and for tied data also the agreement between sklearn's
+    brute-force and default neighbour searches ("sklearn_spread"), which
+    is how far sklearn's result moves with its own tie-breaking.
+    """
+    X = np.asarray(values, dtype=float).reshape(-1, 1)
+    nof_ref = LocalOutlierFactor(n_neighbors=n_neighbors).fit(X).negative_outlier_factor_
+
+    neighbours = lof_1d_neighbours(values, max(n_neighbors, MAX_LOF_NEIGHBORS))
+    nof = lof_1d_scores(values, n_neighbors, neighbours)
+    tied = has_boundary_ties(neighbours[1], min(n_neighbors, len(nof) - 1))
+
+    spread = None
+    if tied:
+        nof_brute = LocalOutlierFactor(n_neighbors=n_neighbors, algorithm="brute").fit(X).negative_outlier_factor_
+        spread = lof_agreement(nof_brute, nof_ref, contamination)
+
+    return {**lof_agreement(nof, nof_ref, contamination), "tied": tied, "sklearn_spread": spread}
+
+
+# Agreement required on tied data, or sklearn's own spread if that is lower
+MIN_FLAGGED_OVERLAP = 0.8
+MIN_RANK_CORRELATION = 0.9
+
+
+if __name__ == "__main__":
+    # sklearn warns about duplicates on the rounded samples
+    warnings.simplefilter("ignore", UserWarning)
+
+    failed = False
+    for seed in range(3):
+        wind = np.random.default_rng(seed).gamma(2.0, 3.0, size=24 * 365)
+        samples = {
+            "continuous": wind,
+            "rounded to 0.1": np.round(wind, 1),
+            "rounded to 1": np.round(wind),
+        }
+
+        for name, values in samples.items():
+            for k in (5, 20, MAX_LOF_NEIGHBORS):
+                check = validate_lof_1d(values, k)
+                spread = check["sklearn_spread"]
+                if check["tied"]:
+                    ok = (check["flagged_overlap"] >= min(MIN_FLAGGED_OVERLAP, spread["flagged_overlap"])
+                          and check["rank_correlation"] >= min(MIN_RANK_CORRELATION, spread["rank_correlation"]))
+                    limit = (f" (sklearn brute vs tree {spread['flagged_overlap']:.2f}, "
+                             f"{spread['rank_correlation']:.3f})")
+                else:
+                    ok = check["label_mismatches"] == 0 and check["max_score_diff"] < 1e-6
+                    limit = ""
+                failed |= not ok
+                print(f"seed {seed} {name:>15} k={k:<3}: max score diff {check['max_score_diff']:.1e}, "
+                      f"label mismatches {check['label_mismatches']:>3}, "
+                      f"flagged overlap {check['flagged_overlap']:.2f}, "
+                      f"rank correlation {check['rank_correlation']:.3f}{limit}  {'ok' if ok else 'FAILED'}")
+
+    raise SystemExit(failed)
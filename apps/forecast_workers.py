@@ -0,0 +1,340 @@
+# apps/forecast_workers.py
+#
+# Worker functions for the Forecasting page that run in separate processes.
+# They live in their own module because functions defined inside a
+# Streamlit page script cannot be pickled into a worker process.
+#
+# Workers are started with "spawn": the Streamlit server is multi-threaded,
+# and forking it from a job thread can deadlock the child.
+
+import itertools
+import multiprocessing as mp
+import os
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+
+MP_CONTEXT = mp.get_context("spawn")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# Order search ---------------------------------------------------------------
+
+def candidate_orders(max_p=2, d_values=(0, 1), max_q=2, max_P=1, D_values=(0, 1), max_Q=1, s=24):
+    """
+    Bounded grid of (order, seasonal_order) pairs, simplest models first.
+    Without seasonality (s <= 1) only non-seasonal orders are returned.
+    """
+    if s <= 1:
+        max_P, D_values, max_Q = 0, (0,), 0
+
+    grid = [
+        ((p, d, q), (P, D, Q, s if (P or D or Q) else 0))
+        for p, d, q, P, D, Q in itertools.product(
+            range(max_p + 1), d_values, range(max_q + 1),
+            range(max_P + 1), D_values, range(max_Q + 1)
+        )
+    ]
+    grid = list(dict.fromkeys(grid))
+    return sorted(grid, key=lambda c: sum(c[0]) + sum(c[1][:3]))
+
+
+def fit_candidate(y, exog, order, seasonal_order, maxiter=50):
+    """
+    Fit one SARIMAX candidate and return its information criteria.
+    low_memory skips the smoothed state, which is not needed for AIC/BIC.
+    """
+    t0 = time.perf_counter()
+    model = sm.tsa.statespace.SARIMAX(
+        y,
+        exog=exog,
+        order=order,
+        seasonal_order=seasonal_order,
+        enforce_stationarity=False,
+        enforce_invertibility=False,
+    )
+    results = model.fit(disp=False, maxiter=maxiter, low_memory=True)
+    converged = bool(results.mle_retvals.get("converged", True))
+
+    return {
+        "aic": float(results.aic),
+        "bic": float(results.bic),
+        "converged": converged,
+        "elapsed": time.perf_counter() - t0,
+    }
+
+
+def _worker_pid():
+    return os.getpid()
+
+
+def _start_pool(workers):
+    """
+    Process pool with every worker started. Spawned workers take a couple
+    of seconds to import statsmodels, which should not count against a
+    candidate's timeout.
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=MP_CONTEXT)
+    started = set()
+    while len(started) < workers:
+        started.update(f.result() for f in [pool.submit(_worker_pid) for _ in range(workers)])
+    return pool
+
+
+def _dominates(candidate, failed):
+    """True if candidate has the same differencing and at least the orders of failed."""
+    (p, d, q), (P, D, Q, _) = candidate
+    (fp, fd, fq), (fP, fD, fQ, _) = failed
+    return d == fd and D == fD and p >= fp and q >= fq and P >= fP and Q >= fQ
+
+
+def order_search(y, exog, candidates, workers=2, timeout=60, maxiter=50,
+                 should_stop=None, progress=None):
+    """
+    Fit the candidates on one process pool, at most `workers` at a time.
+
+    A fit inside a pool worker cannot be stopped on its own, so when a
+    candidate runs longer than `timeout` seconds the pool is terminated and
+    a new one started; the candidates that were still running with it are
+    resubmitted. Candidates that dominate a failed or non-converging fit
+    (same d and D, no smaller orders) are pruned without fitting.
+
+    Parameters:
+      should_stop: optional callable; the search is aborted when it returns True
+      progress: optional callable progress(done, total)
+
+    Returns:
+      A list of dicts, one per candidate, with order, seasonal_order, aic,
+      bic, elapsed and status ("ok", "not converged", "failed", "timeout",
+      "pruned" or "cancelled").
+    """
+    pending = list(candidates)
+    running = {}  # future -> (candidate, start time)
+    bad = []
+    rows = []
+
+    def record(candidate, status, **values):
+        order, seasonal_order = candidate
+        rows.append({
+            "order": order,
+            "seasonal_order": seasonal_order,
+            "aic": values.get("aic", np.nan),
+            "bic": values.get("bic", np.nan),
+            "elapsed": values.get("elapsed", np.nan),
+            "status": status,
+        })
+        if progress is not None:
+            progress(len(rows), len(candidates))
+
+    def submit(candidate):
+        future = pool.submit(fit_candidate, y, exog, candidate[0], candidate[1], maxiter)
+        running[future] = (candidate, time.perf_counter())
+
+    pool = _start_pool(workers)
+    try:
+        while pending or running:
+            if should_stop is not None and should_stop():
+                for candidate, _ in running.values():
+                    record(candidate, "cancelled")
+                for candidate in pending:
+                    record(candidate, "cancelled")
+                break
+
+            # Start new candidates
+            while pending and len(running) < workers:
+                candidate = pending.pop(0)
+                if any(_dominates(candidate, failed) for failed in bad):
+                    record(candidate, "pruned")
+                    continue
+                submit(candidate)
+            if not running:
+                continue
+
+            # Collect finished candidates
+            done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                candidate, _ = running.pop(future)
+                try:
+                    res = future.result()
+                except Exception:
+                    bad.append(candidate)
+                    record(candidate, "failed")
+                    continue
+
+                if not res["converged"]:
+                    bad.append(candidate)
+                    record(candidate, "not converged", **res)
+                else:
+                    record(candidate, "ok", **res)
+
+            # Restart the pool if a candidate overran, or a worker died
+            now = time.perf_counter()
+            overrun = [f for f, (_, started) in running.items() if now - started > timeout]
+            if overrun or pool._broken:
+                _stop_pool(pool)
+                for future in overrun:
+                    candidate, _ = running.pop(future)
+                    bad.append(candidate)
+                    record(candidate, "timeout", elapsed=timeout)
+
+                resubmit = [candidate for candidate, _ in running.values()]
+                running.clear()
+                pool = _start_pool(workers)
+                for candidate in resubmit:
+                    submit(candidate)
+    finally:
+        if running:
+            _stop_pool(pool)
+        else:
+            pool.shutdown()
+
+    return rows
+
+
+# Rolling-origin backtesting ---------------------------------------------------
+
+def backtest_chunk(y, exog, order, seasonal_order, origins, window, H,
+                   start_params=None, maxiter=50, warm_maxiter=5):
+    """
+    Fit and forecast a run of adjacent folds in order.
+
+    Each fold trains on the `window` hours before its origin and forecasts
+    H hours ahead. The parameters of one fold are the starting point of the
+    next, so after the first fold only a few optimizer iterations are needed.
+    Exogenous values over the forecast horizon are taken as observed.
+
+    Returns:
+      errors: (len(origins), H) actual minus forecast
+      actuals: (len(origins), H) observed values
+    """
+    errors = np.full((len(origins), H), np.nan)
+    actuals = np.full((len(origins), H), np.nan)
+    params = start_params
+
+    for i, origin in enumerate(origins):
+        train = slice(origin - window, origin)
+        test = slice(origin, origin + H)
+
+        model = sm.tsa.statespace.SARIMAX(
+            y.iloc[train],
+            exog=None if exog is None else exog.iloc[train],
+            order=order,
+            seasonal_order=seasonal_order,
+            enforce_stationarity=False,
+            enforce_invertibility=False,
+        )
+        try:
+            # Warm-started fits stop early on purpose; don't warn about it
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                results = model.fit(start_params=params, disp=False, low_memory=True,
+                                    maxiter=maxiter if params is None else warm_maxiter)
+        except Exception:
+            continue
+        params = results.params
+
+        forecast = results.forecast(H, exog=None if exog is None else exog.iloc[test])
+        actuals[i] = y.iloc[test].to_numpy()
+        errors[i] = actuals[i] - np.asarray(forecast)
+
+    return errors, actuals
+
+
+def rolling_origins(n, window, H, n_folds, step):
+    """Forecast origins (positions in the series), the last one ending at the end of the data."""
+    last = n - H
+    origins = last - step * np.arange(n_folds)[::-1]
+    return origins[origins >= window]
+
+
+def rolling_backtest(y, exog, order, seasonal_order, window=672, H=24, n_folds=20, step=24,
+                     workers=2, should_stop=None):
+    """
+    Rolling-origin backtest with folds spread over a process pool.
+
+    Adjacent folds go to the same worker so they can warm-start from each
+    other; every worker starts from the parameters of one fit on the first
+    fold.
+
+    should_stop is polled while the chunks run; on a stop the workers are
+    terminated and only the finished chunks are returned, or JobCancelled
+    is raised if none had finished.
+
+    Returns:
+      origins, errors (n_folds, H) and actuals (n_folds, H)
+    """
+    origins = rolling_origins(len(y), window, H, n_folds, step)
+    if len(origins) == 0:
+        raise ValueError("Not enough data for the chosen window, horizon and folds.")
+
+    first = slice(origins[0] - window, origins[0])
+    start_params = sm.tsa.statespace.SARIMAX(
+        y.iloc[first],
+        exog=None if exog is None else exog.iloc[first],
+        order=order,
+        seasonal_order=seasonal_order,
+        enforce_stationarity=False,
+        enforce_invertibility=False,
+    ).fit(disp=False, low_memory=True).params
+
+    chunks = [c for c in np.array_split(origins, min(workers, len(origins))) if len(c)]
+    pool = ProcessPoolExecutor(max_workers=len(chunks), mp_context=MP_CONTEXT)
+    futures = {
+        pool.submit(backtest_chunk, y, exog, order, seasonal_order, chunk, window, H, start_params): i
+        for i, chunk in enumerate(chunks)
+    }
+
+    parts = {}
+    pending = set(futures)
+    try:
+        while pending:
+            if should_stop is not None and should_stop():
+                break
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                parts[futures[future]] = future.result()
+    finally:
+        if pending:
+            _stop_pool(pool)
+        else:
+            pool.shutdown()
+
+    if not parts:
+        raise JobCancelled()
+
+    # After a cancel only the finished chunks are returned
+    done_chunks = sorted(parts)
+    origins = np.concatenate([chunks[i] for i in done_chunks])
+    errors = np.vstack([parts[i][0] for i in done_chunks])
+    actuals = np.vstack([parts[i][1] for i in done_chunks])
+    return origins, errors, actuals
+
+
+def _stop_pool(pool):
+    """Drop queued work and terminate the workers that are still running."""
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for proc in processes:
+        proc.terminate()
+
+
+def backtest_metrics(errors, actuals):
+    """MAE, RMSE and MAPE per forecast step, over all folds."""
+    abs_err = np.abs(errors)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = np.where(actuals != 0, abs_err / np.abs(actuals), np.nan) * 100
+
+    return pd.DataFrame({
+        "horizon": np.arange(1, errors.shape[1] + 1),
+        "MAE": np.nanmean(abs_err, axis=0),
+        "RMSE": np.sqrt(np.nanmean(errors ** 2, axis=0)),
+        "MAPE (%)": np.nanmean(pct, axis=0),
+    })
@@ -8,7 +8,19 @@ from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 import matplotlib.pyplot as plt
 import statsmodels.api as sm
+from statsmodels.tsa.statespace.kalman_filter import MEMORY_CONSERVE, MEMORY_NO_FORECAST_COV
+import requests
 import datetime as dt
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from forecast_workers import (candidate_orders, order_search, rolling_backtest, backtest_metrics,
+                              JobCancelled)
+from plot_utils import line_trace
 
 
 st.set_page_config(page_title="Forecasting of energy production and consumption")
@@ -47,6 +59,436 @@ def load_mongo_data():
     return df_production, df_consumption
 
 
+@st.cache_data(ttl=6000)
+def build_wide_table(_df, dataset):
+    """
+    Hourly-regular wide table with one column per "group_pricearea".
+
+    Built once per dataset and cached; the frame itself is not hashed.
+    Short gaps are filled the same way as before fitting.
+    """
+    group_col = "productiongroup" if dataset == "production" else "consumptiongroup"
+
+    df_wide = (
+        _df
+        .reset_index()
+        .pivot_table(index="starttime", columns=[group_col, "pricearea"], values="quantitykwh", aggfunc="mean")
+    )
+
+    # flatten columns and ensure hourly index
+    df_wide.columns = [f"{grp}_{area}" for grp, area in df_wide.columns]
+    df_wide = df_wide.sort_index().asfreq("H")
+
+    # Basic NaN handling (short gaps)
+    return df_wide.ffill().interpolate(limit=24)
+
+
+# Weather feature store ----------------------------------------------------
+# ERA5 variables for each price area, aligned to the hourly energy index
+# once (a reindex, not a merge on datetimes) with lagged copies precomputed.
+# Columns are named "<variable>_<area>" and "<variable>_<area>_lag<h>" so
+# they can be chosen as exogenous variables like the energy columns.
+
+area_coords = {
+    "NO1": (59.91, 10.75),
+    "NO2": (58.15, 7.99),
+    "NO3": (63.43, 10.39),
+    "NO4": (69.65, 18.96),
+    "NO5": (60.39, 5.32)
+}
+
+WEATHER_VARS = ["temperature_2m", "precipitation", "wind_speed_10m", "wind_gusts_10m"]
+WEATHER_LAGS = (1, 3, 6, 24)
+
+
+@st.cache_data(ttl=6000)
+def load_weather_year(lat, lon, year):
+    url = (
+        f"https://archive-api.open-meteo.com/v1/era5?"
+        f"latitude={lat}&longitude={lon}"
+        f"&start_date={year}-01-01&end_date={year}-12-31"
+        f"&hourly={','.join(WEATHER_VARS)}&timezone=Europe%2FOslo"
+    )
+
+    r = requests.get(url)
+    if r.status_code != 200:
+        return None
+
+    df = pd.DataFrame(r.json()["hourly"])
+    df["time"] = pd.to_datetime(df["time"])
+    df = df.set_index("time")
+    # Local times repeat at the DST change; keep the first
+    return df[~df.index.duplicated()]
+
+
+@st.cache_data(ttl=6000)
+def weather_features(_index, dataset, area):
+    """
+    Weather features for one price area on the hourly index of a wide table.
+
+    The index is not hashed; the cache is keyed on dataset and area, which
+    determine it.
+    """
+    lat, lon = area_coords[area]
+    frames = [load_weather_year(lat, lon, year) for year in range(_index.min().year, _index.max().year + 1)]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame(index=_index)
+
+    weather = pd.concat(frames)[WEATHER_VARS]
+    if _index.tz is not None:
+        # Open-Meteo times are Oslo local time; the energy index may be in another zone
+        weather.index = weather.index.tz_localize("Europe/Oslo", ambiguous="NaT", nonexistent="NaT")
+        weather = weather[weather.index.notna()]
+        weather.index = weather.index.tz_convert(_index.tz)
+
+    aligned = weather.reindex(_index).interpolate(limit=24)
+    aligned.columns = [f"{var}_{area}" for var in WEATHER_VARS]
+
+    lagged = [aligned.shift(lag).add_suffix(f"_lag{lag}") for lag in WEATHER_LAGS]
+    return pd.concat([aligned, *lagged], axis=1)
+
+
+@st.cache_data(ttl=6000)
+def feature_table(_df, dataset, area):
+    """The wide energy table joined with the weather features of one price area."""
+    df_wide = build_wide_table(_df, dataset)
+    return df_wide.join(weather_features(df_wide.index, dataset, area))
+
+
+def is_weather(col):
+    return col.startswith(tuple(WEATHER_VARS))
+
+
+def exog_table(df, dataset, area, cols):
+    """Table to take exogenous columns from; weather is only loaded when used."""
+    if any(is_weather(c) for c in cols):
+        return feature_table(df, dataset, area)
+    return build_wide_table(df, dataset)
+
+
+def exog_future_values(df_wide, cols, last_index, future_index):
+    """
+    Exogenous values over the forecast hours. Weather columns use the stored
+    ERA5 values where they exist, as a stand-in for a weather forecast;
+    energy columns, and hours past the stored data, repeat the last observed
+    row.
+    """
+    last_exog = df_wide[cols].loc[:last_index].iloc[-1]
+    future = pd.DataFrame([last_exog.values] * len(future_index), columns=cols, index=future_index)
+
+    weather = [c for c in cols if is_weather(c)]
+    if weather:
+        future[weather] = df_wide[weather].reindex(future_index).fillna(future[weather])
+    return future
+
+
+# Fitted model cache -------------------------------------------------------
+# Only the estimated parameters, their covariance and the summary text are
+# cached, in memory and on disk, keyed by a hash of the training slice, the
+# exogenous data and the orders. Full results hold per-hour state
+# covariances (gigabytes for a year of hourly data); on a hit the results
+# are rebuilt with one Kalman filter pass, with no optimisation and no
+# Hessian. Both levels are LRU: the least recently used entries are
+# dropped first.
+
+FIT_CACHE_DIR = "data/models/sarimax"
+FIT_CACHE_MEMORY = 16
+FIT_CACHE_DISK = 64
+
+# Keep only the last filtered states, plus the forecast error variances
+# that get_forecast needs for its confidence intervals
+FILTER_MEMORY = MEMORY_CONSERVE & ~MEMORY_NO_FORECAST_COV
+
+
+def fit_key(y, exog, order, seasonal_order):
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(y, index=True).values.tobytes())
+    if exog is not None:
+        h.update(",".join(exog.columns).encode())
+        h.update(pd.util.hash_pandas_object(exog, index=True).values.tobytes())
+    h.update(repr((tuple(order), tuple(seasonal_order))).encode())
+    return h.hexdigest()
+
+
+@st.cache_resource
+def fit_cache():
+    return {"fits": OrderedDict(), "lock": threading.Lock()}
+
+
+def sarimax_model(y, exog, order, seasonal_order):
+    return sm.tsa.statespace.SARIMAX(
+        y,
+        exog=exog,
+        order=order,
+        seasonal_order=seasonal_order,
+        enforce_stationarity=False,
+        enforce_invertibility=False,
+    )
+
+
+def fit_sarimax(y, exog, order, seasonal_order, callback=None):
+    """
+    Estimated parameters, their covariance and the summary text, i.e. all
+    that needs the numerical Hessian. The results object is dropped here:
+    it keeps the job callback (a closure) in mle_settings and could not be
+    pickled.
+    """
+    results = sarimax_model(y, exog, order, seasonal_order).fit(disp=False, callback=callback, low_memory=True)
+    return {
+        "params": results.params,
+        "cov_params": results.cov_params(),
+        "summary": results.summary().as_text(),
+    }
+
+
+def filter_sarimax(model, params):
+    """
+    Results for fixed parameters. cov_type="none" skips the numerical
+    Hessian (seconds on a year of hourly data); forecasts and their
+    intervals don't use it.
+    """
+    return model.filter(params, conserve_memory=FILTER_MEMORY, cov_type="none")
+
+
+def filter_state(results):
+    """Predicted state mean and covariance after the last observation."""
+    fr = results.filter_results
+    return fr.predicted_state[:, -1].copy(), fr.predicted_state_cov[:, :, -1].copy()
+
+
+def extend_filter(inputs, params, state, y, exog):
+    """
+    Filter new observations that follow a filtered series, starting from
+    its final state, with fixed parameters. Same forecasts as
+    results.extend, without keeping the earlier results around.
+    """
+    model = sarimax_model(y, exog, inputs["order"], inputs["seasonal_order"])
+    model.initialize_known(*state)
+    return filter_sarimax(model, params)
+
+
+def prune_disk_cache(max_files=FIT_CACHE_DISK):
+    files = [os.path.join(FIT_CACHE_DIR, f) for f in os.listdir(FIT_CACHE_DIR) if f.endswith(".pkl")]
+    files.sort(key=os.path.getmtime)
+    for path in files[:max(0, len(files) - max_files)]:
+        os.remove(path)
+
+
+def load_cached_fit(path):
+    """Fit stored at path (see fit_sarimax), or None if the file is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        fit = pd.read_pickle(path)
+        fit["params"], fit["cov_params"], fit["summary"]
+    except Exception:
+        os.remove(path)  # a broken file would fail for this key every time
+        return None
+    os.utime(path)  # mark as recently used
+    return fit
+
+
+def save_cached_fit(path, fit):
+    """Write to a temporary file first, so an interrupted write never leaves a truncated cache file."""
+    os.makedirs(FIT_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    pd.to_pickle(fit, tmp)
+    os.replace(tmp, path)
+    prune_disk_cache()
+
+
+def get_fitted_model(y, exog, order, seasonal_order, callback=None):
+    """
+    SARIMAX results for the training data and orders, with the fit (see
+    fit_sarimax) taken from memory, from disk or from a new fit.
+
+    Returns:
+      (results, fit, source) where source is "memory", "disk" or "fitted".
+    """
+    key = fit_key(y, exog, order, seasonal_order)
+    cache = fit_cache()
+
+    with cache["lock"]:
+        fit = cache["fits"].get(key)
+        if fit is not None:
+            cache["fits"].move_to_end(key)
+            source = "memory"
+
+    if fit is None:
+        path = os.path.join(FIT_CACHE_DIR, f"{key}.fit.pkl")
+        fit = load_cached_fit(path)
+        source = "disk"
+
+        if fit is None:
+            fit = fit_sarimax(y, exog, order, seasonal_order, callback=callback)
+            save_cached_fit(path, fit)
+            source = "fitted"
+
+        with cache["lock"]:
+            cache["fits"][key] = fit
+            while len(cache["fits"]) > FIT_CACHE_MEMORY:
+                cache["fits"].popitem(last=False)
+
+    results = filter_sarimax(sarimax_model(y, exog, order, seasonal_order), fit["params"])
+    return results, fit, source
+
+
+# Background forecast jobs -------------------------------------------------
+# Fits run on a shared thread pool so they survive reruns of the script.
+# Each session keeps the ids of its own jobs in st.session_state. A running
+# fit is cancelled from the optimizer callback, which is called after every
+# iteration; an order search checks the cancel flag between candidates.
+
+MAX_ITER = 50  # statsmodels default for lbfgs
+MAX_JOBS = 50
+
+
+@st.cache_resource
+def job_executor():
+    return {"executor": ThreadPoolExecutor(max_workers=2), "jobs": {}}
+
+
+def run_job(job):
+    job["status"] = "running"
+    job["started"] = time.time()
+
+    try:
+        job["result"] = job["runner"](job)
+        job["status"] = "cancelled" if job["cancel"].is_set() else "done"
+    except JobCancelled:
+        job["status"] = "cancelled"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished"] = time.time()
+
+
+def run_forecast_job(job):
+    def callback(params):
+        job["iterations"] += 1
+        job["progress"] = min(job["iterations"] / MAX_ITER, 1.0)
+        if job["cancel"].is_set():
+            raise JobCancelled()
+
+    inputs = job["inputs"]
+    results, fit, source = get_fitted_model(inputs["y"], inputs["exog_train"], inputs["order"],
+                                            inputs["seasonal_order"], callback=callback)
+
+    forecast_res = results.get_forecast(steps=inputs["H"], exog=inputs["exog_future"])
+    # Jobs stay in the shared registry, so keep the parameters and final
+    # state rather than the results object
+    return {
+        "params": fit["params"],
+        "state": filter_state(results),
+        "summary": fit["summary"],
+        "source": source,
+        "forecast_mean": forecast_res.predicted_mean,
+        "forecast_ci": forecast_res.conf_int(),
+    }
+
+
+def run_order_search_job(job):
+    inputs = job["inputs"]
+
+    def progress(done, total):
+        job["iterations"] = done
+        job["progress"] = done / total
+
+    rows = order_search(
+        inputs["y"], inputs["exog_train"], inputs["candidates"],
+        workers=inputs["workers"], timeout=inputs["timeout"],
+        should_stop=job["cancel"].is_set, progress=progress
+    )
+
+    table = pd.DataFrame(rows).sort_values(["aic", "bic"], na_position="last").reset_index(drop=True)
+    return {"table": table}
+
+
+def run_backtest_job(job):
+    inputs = job["inputs"]
+    origins, errors, actuals = rolling_backtest(
+        inputs["y"], inputs["exog_train"], inputs["order"], inputs["seasonal_order"],
+        window=inputs["window"], H=inputs["bt_horizon"], n_folds=inputs["n_folds"],
+        step=inputs["step"], workers=inputs["workers"], should_stop=job["cancel"].is_set
+    )
+    return {
+        "origins": inputs["y"].index[origins],
+        "metrics": backtest_metrics(errors, actuals),
+        "errors": errors,
+    }
+
+
+def submit_forecast_job(label, inputs, runner=run_forecast_job, kind="forecast"):
+    jobs = job_executor()
+    job = {
+        "id": uuid.uuid4().hex[:8],
+        "kind": kind,
+        "label": label,
+        "inputs": inputs,
+        "runner": runner,
+        "status": "queued",
+        "submitted": time.time(),
+        "started": None,
+        "finished": None,
+        "iterations": 0,
+        "progress": 0.0,
+        "cancel": threading.Event(),
+        "result": None,
+        "error": None,
+    }
+    jobs["jobs"][job["id"]] = job
+    job["future"] = jobs["executor"].submit(run_job, job)
+
+    # Forget the oldest finished jobs so the shared registry stays bounded
+    finished = [j for j in jobs["jobs"].values() if j["finished"] is not None]
+    for old in sorted(finished, key=lambda j: j["submitted"])[:max(0, len(jobs["jobs"]) - MAX_JOBS)]:
+        del jobs["jobs"][old["id"]]
+
+    return job["id"]
+
+
+def cancel_forecast_job(job):
+    job["cancel"].set()
+    if job["future"].cancel():
+        job["status"] = "cancelled"
+        job["finished"] = time.time()
+
+
+def job_elapsed(job):
+    if job["started"] is None:
+        return 0.0
+    return (job["finished"] or time.time()) - job["started"]
+
+
+def plot_forecast(y, forecast_mean, forecast_ci):
+    fig = go.Figure()
+
+    fig.add_trace(line_trace(
+        y.index, y.values,
+        mode="lines", name="Training data"
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=forecast_mean.index, y=forecast_mean.values,
+        mode="lines", name="Forecast"
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=forecast_ci.index, y=forecast_ci.iloc[:, 0],
+        mode="lines", line=dict(width=0), showlegend=False
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=forecast_ci.index, y=forecast_ci.iloc[:, 1],
+        mode="lines", fill="tonexty", line=dict(width=0),
+        name="Confidence Interval"
+    ))
+
+    return fig
+
+
 # Cached MongoDB fetch
 if "mongo_data" not in st.session_state:
     df_production, df_consumption = load_mongo_data()
@@ -93,41 +535,42 @@ with c2:
 
     forecast_horizon = st.number_input("Forecast horizon (hours)", 1, 1000, 168)
 
+# Order inputs are keyed so an order search result can be applied to them
+for key, default in {"order_p": 1, "order_d": 1, "order_q": 1,
+                     "order_P": 1, "order_D": 1, "order_Q": 1, "order_s": 24}.items():
+    st.session_state.setdefault(key, default)
+
 with c3:
     st.subheader("SARIMAX Parameters")
 
-    p = st.number_input("p", 0, 5, 1)
-    d = st.number_input("d", 0, 2, 1)
-    q = st.number_input("q", 0, 5, 1)
+    p = st.number_input("p", 0, 5, key="order_p")
+    d = st.number_input("d", 0, 2, key="order_d")
+    q = st.number_input("q", 0, 5, key="order_q")
 
 with c4:
     st.subheader("Seasonal Order")
 
-    P = st.number_input("P", 0, 3, 1)
-    D = st.number_input("D", 0, 2, 1)
-    Q = st.number_input("Q", 0, 3, 1)
-    s = st.number_input("Seasonal period (s)", 1, 8760, 24)
+    P = st.number_input("P", 0, 3, key="order_P")
+    D = st.number_input("D", 0, 2, key="order_D")
+    Q = st.number_input("Q", 0, 3, key="order_Q")
+    s = st.number_input("Seasonal period (s)", 1, 8760, key="order_s")
+
+    seasonality = st.radio("Seasonality", ["Seasonal ARIMA", "Fourier terms"], horizontal=True,
+                           help="Fourier terms model daily, weekly and yearly cycles as regressors "
+                                "with a non-seasonal ARIMA, which stays fast for long periods.")
+    if seasonality == "Fourier terms":
+        fourier_terms = {
+            24: st.number_input("Daily harmonics", 0, 12, 4),
+            168: st.number_input("Weekly harmonics", 0, 12, 3),
+            8766: st.number_input("Yearly harmonics", 0, 12, 2),
+        }
 
 # Choosing exogenous variables
 exog_list = []
 try:
-    # pivot to wide columns like "group_pricearea"
-    if dataset == "production":
-        pivot = (
-            df_energy
-            .reset_index()
-            .pivot_table(index="starttime", columns=["productiongroup", "pricearea"],
-                         values="quantitykwh", aggfunc="mean")
-        )
-    else:
-        pivot = (
-            df_energy
-            .reset_index()
-            .pivot_table(index="starttime", columns=["consumptiongroup", "pricearea"],
-                         values="quantitykwh", aggfunc="mean")
-        )
-
-    cols = [f"{grp}_{area}" for grp, area in pivot.columns]
+    # Cached wide table with columns like "group_pricearea"
+    df_wide = build_wide_table(df_energy, dataset)
+    cols = list(df_wide.columns)
 
     target_col = f"{energy_group}_{selected_area}"
 
@@ -147,33 +590,60 @@ except Exception:
 
 exog_vars = st.multiselect("Exogenous variables (simultaneous categories)", exog_list)
 
+weather_list = [f"{var}_{selected_area}{suffix}" for var in WEATHER_VARS
+                for suffix in [""] + [f"_lag{lag}" for lag in WEATHER_LAGS]]
+weather_vars = st.multiselect("Weather variables (ERA5, lagged by hours)", weather_list,
+                              help="Stored ERA5 weather is also used over the forecast horizon, "
+                                   "in place of a weather forecast.")
+exog_vars = exog_vars + weather_vars
 
-# --- RUN BUTTON ---
-run_model = st.button("Run Forecast")
 
+# Fourier seasonality ------------------------------------------------------
+# Sine/cosine pairs for each seasonal period, used as SARIMAX regressors.
+# Time is counted in hours from a fixed origin, so training and forecast
+# features line up for any index.
 
-if run_model:
-    # --- Build wide-format hourly table for target + exog candidates ---
-    # pivot to have columns like "group_pricearea"
-    if dataset == "production":
-        df_wide = (
-            df_production
-            .reset_index()
-            .pivot_table(index="starttime", columns=["productiongroup", "pricearea"], values="quantitykwh", aggfunc="mean")
-        )
-    else:
-        df_wide = (
-            df_consumption
-            .reset_index()
-            .pivot_table(index="starttime", columns=["consumptiongroup", "pricearea"], values="quantitykwh", aggfunc="mean")
-        )
+FOURIER_ORIGIN = pd.Timestamp("2021-01-01")
 
-    # flatten columns and ensure hourly index
-    df_wide.columns = [f"{grp}_{area}" for grp, area in df_wide.columns]
-    df_wide = df_wide.sort_index().asfreq("H")
 
-    # Basic NaN handling (short gaps)
-    df_wide = df_wide.ffill().interpolate(limit=24)
+@st.cache_data(ttl=6000)
+def fourier_features(index, terms):
+    """
+    Fourier regressors for an hourly index.
+
+    Parameters:
+      index: DatetimeIndex
+      terms: tuple of (period in hours, number of harmonics)
+    """
+    origin = FOURIER_ORIGIN.tz_localize(index.tz) if index.tz is not None else FOURIER_ORIGIN
+    t = ((index - origin) / pd.Timedelta(hours=1)).to_numpy(dtype=float)
+
+    columns = {}
+    for period, k in terms:
+        for j in range(1, k + 1):
+            angle = 2 * np.pi * j * t / period
+            columns[f"sin_{period}_{j}"] = np.sin(angle)
+            columns[f"cos_{period}_{j}"] = np.cos(angle)
+    return pd.DataFrame(columns, index=index)
+
+
+def add_fourier(inputs, terms):
+    """Prepend Fourier regressors to the training and future exog."""
+    future_index = pd.date_range(start=inputs["y"].index[-1] + pd.Timedelta(hours=1),
+                                 periods=inputs["H"], freq="h")
+
+    for key, index in (("exog_train", inputs["y"].index), ("exog_future", future_index)):
+        features = fourier_features(index, terms)
+        if inputs[key] is not None:
+            features = features.join(inputs[key])
+        inputs[key] = features
+    return inputs
+
+
+def prepare_inputs():
+    """Training slice, exogenous data and horizon for the current settings."""
+    # --- Wide-format hourly table for target + exog candidates (cached) ---
+    df_wide = exog_table(df_energy, dataset, selected_area, exog_vars)
 
     # Define target column and check it exists
     target_col = f"{energy_group}_{selected_area}"
@@ -200,64 +670,430 @@ if run_model:
     else:
         exog_train = None
 
-    # Fit SARIMAX with exogenous variables if provided
-    model = sm.tsa.statespace.SARIMAX(
-        y,
-        exog=exog_train,
-        order=(p, d, q),
-        seasonal_order=(P, D, Q, s),
-        enforce_stationarity=False,
-        enforce_invertibility=False,
-    )
-
-    try:
-        results = model.fit(disp=False)
-    except Exception as e:
-        st.error(f"Model fitting failed: {e}")
-        st.stop()
-
-    with st.expander("Model Summary"):
-        st.text(results.summary().as_text())
-
     # Forecast: prepare exog_future for H steps
     H = int(forecast_horizon)
     last_index = y.index[-1]
     future_index = pd.date_range(start=last_index + pd.Timedelta(hours=1), periods=H, freq="H")
 
     if chosen_exogs:
-        # Option 1 (naive): repeat last observed exog row
-        last_exog = df_wide[chosen_exogs].loc[:train_end_dt].iloc[-1]
-        exog_future = pd.DataFrame([last_exog.values] * H, columns=chosen_exogs, index=future_index)     
+        exog_future = exog_future_values(df_wide, chosen_exogs, last_index, future_index)
     else:
         exog_future = None
 
-    # Get forecast using exog_future (if any)
-    forecast_res = results.get_forecast(steps=H, exog=exog_future)
-    forecast_mean = forecast_res.predicted_mean
-    forecast_ci = forecast_res.conf_int()
+    return {
+        "dataset": dataset,
+        "area": selected_area,
+        "target_col": target_col,
+        "y": y,
+        "exog_train": exog_train,
+        "exog_future": exog_future,
+        "exog_cols": chosen_exogs,
+        "fourier_terms": None,
+        "H": H,
+    }
+
+
+def model_inputs(order, seasonal_order, fourier=None):
+    """prepare_inputs plus the model orders, and a label describing the model."""
+    inputs = prepare_inputs()
+    inputs["order"] = tuple(int(v) for v in order)
+    inputs["seasonal_order"] = tuple(int(v) for v in seasonal_order)
+
+    if fourier:
+        # Seasonality comes from the regressors; the ARIMA part stays non-seasonal
+        terms = tuple((period, int(k)) for period, k in fourier.items() if k > 0)
+        inputs = add_fourier(inputs, terms)
+        inputs["fourier_terms"] = terms
+        inputs["seasonal_order"] = (0, 0, 0, 0)
+        seasonal_label = "Fourier " + ", ".join(f"{period}h×{k}" for period, k in terms)
+    else:
+        seasonal_label = str(inputs["seasonal_order"])
+
+    return inputs, f"{inputs['target_col']} {inputs['order']}x{seasonal_label}"
+
+
+def submit_forecast(order, seasonal_order, fourier=None):
+    inputs, label = model_inputs(order, seasonal_order, fourier)
+
+    # Fit in the background (or reuse a cached fit)
+    job_id = submit_forecast_job(f"{label}, {inputs['H']}h", inputs)
+    st.session_state.setdefault("forecast_jobs", []).append(job_id)
+    st.session_state["forecast_view"] = job_id
+
+
+def apply_order(order, seasonal_order, fourier=None):
+    """
+    Button callback: copy a searched order into the order inputs. fourier
+    are the harmonics the search was run with, so the forecast uses the
+    same model the order was chosen for.
+    """
+    st.session_state["order_p"], st.session_state["order_d"], st.session_state["order_q"] = order
+    if not fourier:
+        P_, D_, Q_, s_ = seasonal_order
+        st.session_state["order_P"], st.session_state["order_D"], st.session_state["order_Q"] = P_, D_, Q_
+        if s_:
+            st.session_state["order_s"] = s_
+    st.session_state["forecast_pending"] = (tuple(order), tuple(seasonal_order), fourier)
+
+
+# Incremental updates ------------------------------------------------------
+# A finished forecast keeps its parameters and final filter state. New
+# hours are added with a Kalman filter pass over just those hours, starting
+# from that state and keeping the estimated parameters. Parameters are
+# re-estimated only once a set number of new hours has come in since the
+# last full fit; that refit runs as a background job like any other fit.
+
+def exog_for_index(inputs, df_wide, index):
+    """Exogenous regressors for observed hours, built like the training exog."""
+    parts = []
+    if inputs["fourier_terms"]:
+        parts.append(fourier_features(index, inputs["fourier_terms"]))
+    if inputs["exog_cols"]:
+        parts.append(df_wide[inputs["exog_cols"]].reindex(index).ffill().bfill().fillna(0))
+    return pd.concat(parts, axis=1) if parts else None
+
+
+def future_exog(inputs, df_wide, last_index, H):
+    """Exogenous regressors for the H hours after last_index."""
+    future_index = pd.date_range(start=last_index + pd.Timedelta(hours=1), periods=H, freq="h")
+
+    parts = []
+    if inputs["fourier_terms"]:
+        parts.append(fourier_features(future_index, inputs["fourier_terms"]))
+    if inputs["exog_cols"]:
+        parts.append(exog_future_values(df_wide, inputs["exog_cols"], last_index, future_index))
+    return pd.concat(parts, axis=1) if parts else None
+
+
+def new_live_model(job):
+    """Updatable state for a finished forecast job."""
+    inputs, result = job["inputs"], job["result"]
+    return {
+        "params": result["params"],
+        "state": result["state"],
+        "y": inputs["y"],
+        "exog": inputs["exog_train"],
+        "since_refit": 0,
+        "updates": 0,
+        "refits": 0,
+        "forecast_mean": result["forecast_mean"],
+        "forecast_ci": result["forecast_ci"],
+        "refit_job": None,
+    }
+
+
+def update_live_model(job, df_wide, hours, refit_every):
+    """
+    Add up to `hours` new observations to a finished forecast and re-forecast.
+
+    Returns:
+      "filtered" if the model was updated in place, "refit" if a full refit
+      job was submitted, or None if there was no new data.
+    """
+    live, inputs = job["live"], job["inputs"]
+
+    start = live["y"].index[-1] + pd.Timedelta(hours=1)
+    end = live["y"].index[-1] + pd.Timedelta(hours=hours)
+    new_y = df_wide[inputs["target_col"]].loc[start:end]
+    if new_y.empty:
+        return None
+    new_exog = exog_for_index(inputs, df_wide, new_y.index)
+
+    y = pd.concat([live["y"], new_y])
+    exog = None if new_exog is None else pd.concat([live["exog"], new_exog])
+
+    if live["since_refit"] + len(new_y) >= refit_every:
+        # Re-estimate on everything observed so far. The live model takes
+        # over the refit (and the new hours) once the job is done.
+        refit_inputs = dict(inputs, y=y, exog_train=exog,
+                            exog_future=future_exog(inputs, df_wide, y.index[-1], inputs["H"]))
+        label = f"{job['label']} refit to {y.index[-1]:%Y-%m-%d %H:%M}"
+        live["refit_job"] = submit_forecast_job(label, refit_inputs)
+        st.session_state.setdefault("forecast_jobs", []).append(live["refit_job"])
+        return "refit"
+
+    # Filter the new hours with the current parameters
+    live["y"], live["exog"] = y, exog
+    results = extend_filter(inputs, live["params"], live["state"], new_y, new_exog)
+    live["state"] = filter_state(results)
+    live["since_refit"] += len(new_y)
+    live["updates"] += 1
+
+    forecast_res = results.get_forecast(
+        steps=inputs["H"], exog=future_exog(inputs, df_wide, live["y"].index[-1], inputs["H"])
+    )
+    live["forecast_mean"] = forecast_res.predicted_mean
+    live["forecast_ci"] = forecast_res.conf_int()
+    return "filtered"
+
+
+def collect_refit(live):
+    """Switch the live model to its refit once that job has finished."""
+    refit = job_executor()["jobs"].get(live["refit_job"])
+    if refit is None or refit["status"] in ("queued", "running"):
+        return
+    if refit["status"] == "done":
+        live.update(
+            params=refit["result"]["params"],
+            state=refit["result"]["state"],
+            y=refit["inputs"]["y"],
+            exog=refit["inputs"]["exog_train"],
+            forecast_mean=refit["result"]["forecast_mean"],
+            forecast_ci=refit["result"]["forecast_ci"],
+            since_refit=0,
+            refits=live["refits"] + 1,
+        )
+    live["refit_job"] = None
+
+
+# --- RUN BUTTON ---
+run_model = st.button("Run Forecast")
+
+if run_model:
+    submit_forecast((p, d, q), (P, D, Q, s),
+                    fourier=fourier_terms if seasonality == "Fourier terms" else None)
+
+# An order chosen from the search results is forecast right away
+if "forecast_pending" in st.session_state:
+    submit_forecast(*st.session_state.pop("forecast_pending"))
+
+
+# --- ORDER SEARCH ---
+with st.expander("Automatic order search"):
+    o1, o2, o3 = st.columns(3)
+    with o1:
+        max_p = st.number_input("Max p", 0, 5, 2)
+        max_q = st.number_input("Max q", 0, 5, 2)
+        d_values = st.multiselect("d values", [0, 1, 2], default=[0, 1])
+    with o2:
+        max_P = st.number_input("Max P", 0, 3, 1)
+        max_Q = st.number_input("Max Q", 0, 3, 1)
+        D_values = st.multiselect("D values", [0, 1, 2], default=[0, 1])
+    with o3:
+        search_workers = st.number_input("Parallel workers", 1, os.cpu_count() or 1, min(4, os.cpu_count() or 1))
+        search_timeout = st.number_input("Timeout per candidate (s)", 5, 3600, 120)
+
+    # With Fourier terms the candidates are fitted with the same regressors,
+    # and only non-seasonal orders are searched
+    search_fourier = fourier_terms if seasonality == "Fourier terms" else None
+    candidates = candidate_orders(int(max_p), tuple(d_values) or (0,), int(max_q),
+                                  int(max_P), tuple(D_values) or (0,), int(max_Q),
+                                  0 if search_fourier else int(s))
+    if search_fourier:
+        st.caption(f"{len(candidates)} candidate orders, with the Fourier terms above")
+    else:
+        st.caption(f"{len(candidates)} candidate orders, seasonal period s = {s}")
+
+    if st.button("Run order search"):
+        inputs, _ = model_inputs((p, d, q), (P, D, Q, s), search_fourier)
+        inputs.update(candidates=candidates, workers=int(search_workers), timeout=int(search_timeout),
+                      fourier=search_fourier)
+        label = f"Order search {inputs['target_col']} ({len(candidates)} candidates)"
+        if search_fourier:
+            label += " with Fourier terms"
+        job_id = submit_forecast_job(label, inputs, runner=run_order_search_job, kind="search")
+        st.session_state.setdefault("forecast_jobs", []).append(job_id)
+        st.session_state["forecast_view"] = job_id
+
+
+# --- BACKTESTING ---
+with st.expander("Backtesting"):
+    st.caption("Rolling-origin evaluation of the current model settings over the training period. "
+               "Exogenous variables are taken as observed over each test horizon.")
+    b1, b2, b3 = st.columns(3)
+    with b1:
+        bt_window = st.number_input("Training window per fold (hours)", 168, 8760, 672)
+        bt_horizon = st.number_input("Backtest horizon (hours)", 1, 336, 24)
+    with b2:
+        bt_folds = st.number_input("Number of folds", 2, 200, 20)
+        bt_step = st.number_input("Hours between origins", 1, 720, 24)
+    with b3:
+        bt_workers = st.number_input("Parallel workers", 1, os.cpu_count() or 1, min(4, os.cpu_count() or 1),
+                                     key="bt_workers")
+
+    if st.button("Run backtest"):
+        inputs, label = model_inputs((p, d, q), (P, D, Q, s),
+                                     fourier=fourier_terms if seasonality == "Fourier terms" else None)
+        inputs.update(window=int(bt_window), bt_horizon=int(bt_horizon), n_folds=int(bt_folds),
+                      step=int(bt_step), workers=int(bt_workers))
+        job_id = submit_forecast_job(f"Backtest {label}, {int(bt_folds)} folds", inputs,
+                                     runner=run_backtest_job, kind="backtest")
+        st.session_state.setdefault("forecast_jobs", []).append(job_id)
+        st.session_state["forecast_view"] = job_id
+
+
+# --- PRECOMPUTED FORECASTS ---
+# Written by apps/precompute_forecasts.py, one file per batch run.
+FORECAST_STORE_DIR = "data/forecasts"
+
+
+@st.cache_data(ttl=6000)
+def load_batch_run(path, mtime):
+    """One stored batch run; mtime is part of the cache key so rewritten files are reloaded."""
+    return pd.read_pickle(path)
+
+
+with st.expander("Precomputed forecasts"):
+    runs = []
+    if os.path.isdir(FORECAST_STORE_DIR):
+        runs = sorted((f for f in os.listdir(FORECAST_STORE_DIR) if f.endswith(".pkl")), reverse=True)
+
+    if not runs:
+        st.caption("No batch runs yet. Run `python apps/precompute_forecasts.py` to forecast "
+                   "every group in every price area.")
+    else:
+        run_file = st.selectbox("Batch run", runs)
+        path = os.path.join(FORECAST_STORE_DIR, run_file)
+        run = load_batch_run(path, os.path.getmtime(path))
+        config = run["config"]
+        st.caption(f"Training {config['train_start']} – {config['train_end']}, "
+                   f"SARIMAX {config['order']}x{config['seasonal_order']}, {config['horizon']}h horizon. "
+                   f"{len(run['failed'])} series failed.")
+
+        batch = run["forecasts"]
+        series = batch[["dataset", "group", "pricearea", "aic"]].drop_duplicates(["dataset", "group", "pricearea"])
+        keys = list(series.itertuples(index=False, name=None))
+        current = next((i for i, k in enumerate(keys) if k[:3] == (dataset, energy_group, selected_area)), 0)
+        choice = st.selectbox("Series", range(len(keys)), index=current,
+                              format_func=lambda i: f"{keys[i][0]}: {keys[i][1]}_{keys[i][2]}")
+
+        sel = batch[(batch["dataset"] == keys[choice][0]) & (batch["group"] == keys[choice][1])
+                    & (batch["pricearea"] == keys[choice][2])].set_index("time")
+        observed = sel["observed"].dropna()
+        future = sel.dropna(subset=["mean"])
+        st.plotly_chart(plot_forecast(observed, future["mean"], future[["lower", "upper"]]),
+                        use_container_width=True)
+
+        st.dataframe(series.sort_values(["dataset", "group", "pricearea"]), use_container_width=True,
+                     hide_index=True)
+
+
+# --- JOBS ---
+@st.fragment(run_every=2)
+def jobs_panel():
+    jobs = job_executor()["jobs"]
+    my_jobs = [jobs[j] for j in st.session_state.get("forecast_jobs", []) if j in jobs]
+    if not my_jobs:
+        return
+
+    st.subheader("Forecast Jobs")
+    for job in reversed(my_jobs):
+        c1, c2, c3 = st.columns([4, 2, 1])
+        c1.write(f"**{job['label']}**")
+        c2.write(f"{job['status']} – {job_elapsed(job):.1f} s")
+        if job["status"] == "running":
+            unit = "candidates" if job["kind"] == "search" else "optimizer iterations"
+            c1.progress(job["progress"], text=f"{job['iterations']} {unit}")
+        if job["status"] in ("queued", "running"):
+            if c3.button("Cancel", key=f"cancel_{job['id']}"):
+                cancel_forecast_job(job)
+        elif job["status"] == "done":
+            if c3.button("Show", key=f"show_{job['id']}"):
+                st.session_state["forecast_view"] = job["id"]
+                st.rerun(scope="app")
+        elif job["status"] == "failed":
+            c2.error(job["error"])
+
+    # Re-render the page once when the viewed job has just finished
+    view = jobs.get(st.session_state.get("forecast_view"))
+    if view is not None and view["status"] == "done" and not view.get("shown"):
+        view["shown"] = True
+        st.rerun(scope="app")
+
+    # ... or when a refit of the viewed forecast has finished
+    live = view.get("live") if view is not None else None
+    if live is not None and live["refit_job"] is not None:
+        refit = jobs.get(live["refit_job"])
+        if refit is None or refit["finished"] is not None:
+            st.rerun(scope="app")
+
+
+jobs_panel()
+
+
+# --- RESULT ---
+view = job_executor()["jobs"].get(st.session_state.get("forecast_view"))
+if view is not None and view["status"] == "done" and view["kind"] == "search":
+    view["shown"] = True
+    table = view["result"]["table"]
+
+    st.subheader(view["label"])
+    st.dataframe(table, use_container_width=True)
+
+    best = table[table["status"] == "ok"]
+    if best.empty:
+        st.warning("No candidate converged.")
+    else:
+        choice = st.selectbox(
+            "Model to forecast",
+            best.index,
+            format_func=lambda i: f"{best.loc[i, 'order']}x{best.loc[i, 'seasonal_order']} "
+                                  f"(AIC {best.loc[i, 'aic']:.1f}, BIC {best.loc[i, 'bic']:.1f})"
+        )
+        st.button("Forecast with this order", on_click=apply_order,
+                  args=(best.loc[choice, "order"], best.loc[choice, "seasonal_order"],
+                        view["inputs"]["fourier"]))
+
+elif view is not None and view["status"] == "done" and view["kind"] == "backtest":
+    view["shown"] = True
+    result = view["result"]
+    metrics = result["metrics"]
+
+    st.subheader(view["label"])
+    st.caption(f"{len(result['origins'])} folds, origins {result['origins'][0]} – {result['origins'][-1]}")
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("MAE (all steps)", f"{np.nanmean(np.abs(result['errors'])):,.1f}")
+    m2.metric("RMSE (all steps)", f"{np.sqrt(np.nanmean(result['errors'] ** 2)):,.1f}")
+    m3.metric("MAPE (all steps)", f"{metrics['MAPE (%)'].mean():.1f} %")
 
-    # --- Plot (same layout as before) ---
     fig = go.Figure()
+    for col in ("MAE", "RMSE"):
+        fig.add_trace(go.Scatter(x=metrics["horizon"], y=metrics[col], mode="lines+markers", name=col))
+    fig.update_layout(title="Error by Forecast Horizon", xaxis_title="Hours ahead", yaxis_title="kWh")
+    st.plotly_chart(fig, use_container_width=True)
 
-    fig.add_trace(go.Scatter(
-        x=y.index, y=y.values,
-        mode="lines", name="Training data"
-    ))
+    st.dataframe(metrics, use_container_width=True, hide_index=True)
 
-    fig.add_trace(go.Scatter(
-        x=forecast_mean.index, y=forecast_mean.values,
-        mode="lines", name="Forecast"
-    ))
+elif view is not None and view["status"] == "done":
+    result = view["result"]
+    view["shown"] = True
 
-    fig.add_trace(go.Scatter(
-        x=forecast_ci.index, y=forecast_ci.iloc[:, 0],
-        mode="lines", line=dict(width=0), showlegend=False
-    ))
+    st.subheader(view["label"])
+    if result["source"] != "fitted":
+        st.caption(f"Reused fitted model from {result['source']} cache.")
 
-    fig.add_trace(go.Scatter(
-        x=forecast_ci.index, y=forecast_ci.iloc[:, 1],
-        mode="lines", fill="tonexty", line=dict(width=0),
-        name="Confidence Interval"
-    ))
+    with st.expander("Model Summary"):
+        st.text(result["summary"])
+
+    live = view.setdefault("live", new_live_model(view))
+    collect_refit(live)
+
+    # --- INCREMENTAL UPDATE ---
+    with st.expander("Update with new observations"):
+        st.caption("New hours are filtered through the fitted model without re-estimating "
+                   "its parameters. A full refit runs as a background job once enough new "
+                   "hours have been added.")
+        u1, u2 = st.columns(2)
+        new_hours = u1.number_input("Hours to add", 1, 24 * 90, 24)
+        refit_every = u2.number_input("Full refit after (new hours)", 1, 8760, 168)
+
+        st.caption(f"Observed up to {live['y'].index[-1]}, "
+                   f"{live['since_refit']} hours since the last full fit.")
+
+        if st.button("Add observations", disabled=live["refit_job"] is not None):
+            view_df = df_production if view["inputs"]["dataset"] == "production" else df_consumption
+            view_table = exog_table(view_df, view["inputs"]["dataset"], view["inputs"]["area"],
+                                    view["inputs"]["exog_cols"])
+            outcome = update_live_model(view, view_table, int(new_hours), int(refit_every))
+            if outcome is None:
+                st.warning("No newer observations available.")
+
+        if live["refit_job"] is not None:
+            st.info("A full refit with the new hours is running; the forecast switches to it when done.")
 
+    if live["updates"] or live["refits"]:
+        st.caption(f"Forecast from {live['y'].index[-1]} after {live['updates']} filter update(s) "
+                   f"and {live['refits']} refit(s).")
+    fig = plot_forecast(live["y"], live["forecast_mean"], live["forecast_ci"])
     st.plotly_chart(fig, use_container_width=True)
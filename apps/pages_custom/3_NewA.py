@@ -8,6 +8,11 @@ from scipy.signal import spectrogram
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import os
+import time
+from plot_utils import line_trace, visible_slice, zoomable_chart, ZOOM_POINTS
 
 
 st.set_page_config(page_title="MongoDB Page", layout="wide", initial_sidebar_state="expanded")
@@ -70,6 +75,13 @@ selected_group = st.radio("Select Production Group for Analysis",
                               production_groups,
                               horizontal=True)
 
+years = list(range(2021, 2025))
+start_year, end_year = st.select_slider(
+    "Select year range for analysis:",
+    options=years,
+    value=(2021, 2021)
+)
+
 
 
 tab1, tab2 = st.tabs(["STL Analysis", "Spectrogram"])
@@ -78,18 +90,178 @@ tab1, tab2 = st.tabs(["STL Analysis", "Spectrogram"])
 
 
 # STL and Spectrogram functions
-def stl_decomposition(df, price_area="NO1", production_group="Solar",
-                      period=24, seasonal=7, trend=169, robust=True):
+STL_PARAMS = {"period": 24, "seasonal": 7, "trend": 169, "robust": True}
+
 
+def production_series(df, price_area, production_group):
     data = df[(df["pricearea"] == price_area) &
               (df["productiongroup"] == production_group)]
 
-    ts = data["quantitykwh"]
+    ts = data["quantitykwh"].copy()
     ts.index = pd.to_datetime(data["starttime"])
-    ts = ts.sort_index()
+    return ts.sort_index()
+
+
+def fit_stl(ts, period=24, seasonal=7, trend=169, robust=True):
+    """Fit STL and return the components as one dataframe."""
+    t0 = time.perf_counter()
+    res = STL(ts, period=period, seasonal=seasonal, trend=trend, robust=robust).fit()
+    components = pd.DataFrame({
+        "original": ts,
+        "trend": res.trend,
+        "seasonal": res.seasonal,
+        "resid": res.resid,
+    })
+    components.attrs["elapsed"] = time.perf_counter() - t0
+    return components
+
+
+@st.cache_data(ttl=6000)
+def fast_decomposition(ts, period=24, trend=169):
+    """
+    Quick additive decomposition for previews of long series.
+
+    Trend is a centred moving average over `trend` hours, seasonal is the
+    mean detrended value at each hour of the period (shifted to mean zero).
+    Everything is vectorized, so several years of hourly data take
+    milliseconds instead of the seconds a robust STL fit needs.
+    """
+    t0 = time.perf_counter()
+
+    trend_ma = ts.rolling(trend, center=True, min_periods=1).mean()
+    detrended = (ts - trend_ma).to_numpy()
+
+    # Phase from the wall-clock hour, so missing hours and DST changes don't shift it
+    wall = ts.index.tz_localize(None) if ts.index.tz is not None else ts.index
+    phase = ((wall - pd.Timestamp(0)) // pd.Timedelta(hours=1)).to_numpy() % period
+    valid = ~np.isnan(detrended)
+    sums = np.bincount(phase[valid], weights=detrended[valid], minlength=period)
+    counts = np.bincount(phase[valid], minlength=period)
+    with np.errstate(invalid="ignore"):
+        profile = sums / counts
+    profile -= np.nanmean(profile)
+    seasonal = pd.Series(profile[phase], index=ts.index)
+
+    components = pd.DataFrame({
+        "original": ts,
+        "trend": trend_ma,
+        "seasonal": seasonal,
+        "resid": ts - trend_ma - seasonal,
+    })
+    components.attrs["elapsed"] = time.perf_counter() - t0
+    return components
+
+
+# STL results are shared between reruns and sessions. Fits are keyed on
+# (area, group, year, parameters) and run in a background thread pool, so
+# switching tabs or areas only looks up a finished result. Failed fits keep
+# their error for STL_RETRY_SECONDS, so they are not resubmitted on every
+# rerun, but a transient failure is retried by a later request.
+STL_RETRY_SECONDS = 60
+
+
+@st.cache_resource
+def stl_cache():
+    return {
+        "results": {},
+        "pending": {},
+        "failed": {},
+        "lock": threading.Lock(),
+        "executor": ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)),
+    }
+
+
+def stl_key(price_area, production_group, year, params):
+    return (price_area, production_group, year, tuple(sorted(params.items())))
+
+
+def stl_known(cache, key):
+    """
+    True if key has a result, a running fit or a recent failure. An older
+    failure is forgotten, so the key is fitted again. Call with the lock held.
+    """
+    failed = cache["failed"].get(key)
+    if failed is not None and time.monotonic() - failed[1] > STL_RETRY_SECONDS:
+        del cache["failed"][key]
+    return key in cache["results"] or key in cache["pending"] or key in cache["failed"]
+
+
+def submit_stl(ts, key, params):
+    """Start a background STL fit for key unless it is done, running or has failed."""
+    cache = stl_cache()
+    with cache["lock"]:
+        if stl_known(cache, key):
+            return
+        if ts.empty:
+            cache["failed"][key] = (ValueError("no production data for this selection"), time.monotonic())
+            return
+
+        future = cache["executor"].submit(fit_stl, ts, **params)
+        cache["pending"][key] = future
+
+    def store(f):
+        with cache["lock"]:
+            cache["pending"].pop(key, None)
+            if f.exception() is None:
+                cache["results"][key] = f.result()
+            else:
+                cache["failed"][key] = (f.exception(), time.monotonic())
+
+    future.add_done_callback(store)
+
+
+def get_stl(ts, key, params):
+    """Cached STL components for key, waiting for a running fit if needed."""
+    cache = stl_cache()
+    submit_stl(ts, key, params)
+
+    with cache["lock"]:
+        if key in cache["results"]:
+            return cache["results"][key]
+        if key in cache["failed"]:
+            raise cache["failed"][key][0]
+        future = cache["pending"][key]
+
+    return future.result()
+
+
+def precompute_stl(df, year, params=STL_PARAMS):
+    """Queue STL fits for every price area and production group not seen before."""
+    cache = stl_cache()
+    for area in price_areas:
+        for group in production_groups:
+            key = stl_key(area, group, year, params)
+            with cache["lock"]:
+                if stl_known(cache, key):
+                    continue
+            submit_stl(production_series(df, area, group), key, params)
+
+
+def stl_progress(year, params=STL_PARAMS):
+    results = stl_cache()["results"]
+    return sum(
+        stl_key(area, group, year, params) in results
+        for area in price_areas for group in production_groups
+    )
 
-    stl = STL(ts, period=period, seasonal=seasonal, trend=trend, robust=robust)
-    res = stl.fit()
+
+def cached_stl(price_area, production_group, year, params=STL_PARAMS):
+    """Finished STL result for the key, or None if it has not been computed."""
+    return stl_cache()["results"].get(stl_key(price_area, production_group, year, params))
+
+
+def stl_decomposition(df, price_area="NO1", production_group="Solar", year=2021,
+                      period=24, seasonal=7, trend=169, robust=True, fast=False, x_range=None):
+
+    params = {"period": period, "seasonal": seasonal, "trend": trend, "robust": robust}
+
+    ts = production_series(df, price_area, production_group)
+    if fast:
+        res = fast_decomposition(ts, period=period, trend=trend)
+        method = "Fast Preview"
+    else:
+        res = get_stl(ts, stl_key(price_area, production_group, year, params), params)
+        method = "STL"
 
     fig = make_subplots(
         rows=4, cols=1, shared_xaxes=True,
@@ -97,48 +269,90 @@ def stl_decomposition(df, price_area="NO1", production_group="Solar",
         subplot_titles=["Original", "Trend", "Seasonal", "Residual"]
     )
 
-    fig.add_trace(go.Scatter(x=ts.index, y=ts, name="Original"), row=1, col=1)
-    fig.add_trace(go.Scatter(x=ts.index, y=res.trend, name="Trend"), row=2, col=1)
-    fig.add_trace(go.Scatter(x=ts.index, y=res.seasonal, name="Seasonal"), row=3, col=1)
-    fig.add_trace(go.Scatter(x=ts.index, y=res.resid, name="Residual"), row=4, col=1)
+    # Decomposition of the whole series, drawn for the visible range only
+    sl = visible_slice(ts.index, x_range)
+    x = ts.index[sl]
+    fig.add_trace(line_trace(x, ts.iloc[sl], max_points=ZOOM_POINTS, name="Original"), row=1, col=1)
+    fig.add_trace(line_trace(x, res.trend.iloc[sl], max_points=ZOOM_POINTS, name="Trend"), row=2, col=1)
+    fig.add_trace(line_trace(x, res.seasonal.iloc[sl], max_points=ZOOM_POINTS, name="Seasonal"), row=3, col=1)
+    fig.add_trace(line_trace(x, res.resid.iloc[sl], max_points=ZOOM_POINTS, name="Residual"), row=4, col=1)
 
     fig.update_layout(
         height=900,
         showlegend=False,
-        title=f"{production_group} Production ({price_area}) – STL Decomposition"
+        title=f"{production_group} Production ({price_area}) – {method} Decomposition"
     )
 
     return fig
 
 
-def plot_spectrogram(df, price_area="NO1", production_group="Solar",
-                     window_length=256, overlap=128):
+def aligned_production(df):
+    """
+    All production series on one regular hourly index, one column per
+    (area, group). Short gaps are interpolated and missing series stay NaN.
+    """
+    wide = df.pivot_table(index="starttime", columns=["pricearea", "productiongroup"],
+                          values="quantitykwh", aggfunc="sum").sort_index()
+    wide = wide.reindex(pd.date_range(wide.index.min(), wide.index.max(), freq="h"))
+    return wide.interpolate(limit_direction="both")
 
-    data = df[(df["pricearea"] == price_area) &
-              (df["productiongroup"] == production_group)]
 
-    ts = data["quantitykwh"].values
-    times = pd.to_datetime(data["starttime"]).sort_values()
+@st.cache_data(ttl=6000)
+def batched_spectrograms(_df, year, window_length=256, overlap=128):
+    """
+    Spectrograms of every (area, group) series in one vectorized call.
+
+    The frame is not hashed; the cache is keyed on the year selection and
+    window parameters.
+
+    Returns:
+      columns: list of (area, group) for the first axis of z_db
+      f: frequencies [1/hour]
+      t_dates: segment centre times
+      z_db: power in dB, shape (n_series, n_freq, n_segments)
+    """
+    wide = aligned_production(_df)
+    X = wide.to_numpy().T
+
+    # Series that are missing entirely are zeros here and dropped below
+    present = ~np.isnan(X).all(axis=1)
+    f, t, Sxx = spectrogram(np.nan_to_num(X[present]), fs=1.0,
+                            nperseg=window_length, noverlap=overlap, axis=-1)
+
+    # fs=1/hour, so t is in hours from the first timestamp
+    t_dates = wide.index[0] + pd.to_timedelta(t, unit="h")
+    z_db = 10 * np.log10(Sxx + 1e-12)
+
+    columns = [col for col, keep in zip(wide.columns, present) if keep]
+    return columns, f, t_dates, z_db
+
+
+def spectrogram_heatmap(f, t_dates, z_db, showscale=True, zrange=None):
+    """Heatmap trace; zrange=(zmin, zmax) defaults to the 1st-99th percentile of z_db."""
+    zmin, zmax = zrange if zrange is not None else np.percentile(z_db, [1, 99])
+    return go.Heatmap(
+        x=t_dates,
+        y=f,
+        z=z_db,
+        colorscale="Viridis",
+        zmin=zmin,
+        zmax=zmax,
+        colorbar=dict(title="Power [dB]"),
+        showscale=showscale
+    )
 
-    f, t, Sxx = spectrogram(ts, nperseg=window_length, noverlap=overlap)
 
-    dt = times.iloc[1] - times.iloc[0]
-    t_dates = [times.iloc[0] + i * dt for i in t]
+def plot_spectrogram(df, price_area="NO1", production_group="Solar",
+                     window_length=256, overlap=128, year=2021):
 
-    z_db = 10 * np.log10(Sxx + 1e-12)
+    columns, f, t_dates, z_db = batched_spectrograms(df, year, window_length, overlap)
 
-    fig = go.Figure(
-        data=go.Heatmap(
-            x=t_dates,
-            y=f,
-            z=z_db,
-            colorscale="Viridis",
-            zmin=np.percentile(z_db, 1),
-            zmax=np.percentile(z_db, 99),
-            colorbar=dict(title="Power [dB]")
-
-        )
-    )
+    if (price_area, production_group) not in columns:
+        return None
+
+    z = z_db[columns.index((price_area, production_group))]
+
+    fig = go.Figure(data=spectrogram_heatmap(f, t_dates, z))
 
     fig.update_layout(
         title=f"Spectrogram of {production_group} Production ({price_area})",
@@ -150,24 +364,184 @@ def plot_spectrogram(df, price_area="NO1", production_group="Solar",
     return fig
 
 
+def plot_spectrogram_areas(df, production_group="Solar",
+                           window_length=256, overlap=128, year=2021):
+    """Spectrograms of one production group in every price area, stacked."""
+
+    columns, f, t_dates, z_db = batched_spectrograms(df, year, window_length, overlap)
+    areas = [area for area in price_areas if (area, production_group) in columns]
+
+    if not areas:
+        return None
+
+    fig = make_subplots(rows=len(areas), cols=1, shared_xaxes=True,
+                        vertical_spacing=0.03, subplot_titles=areas)
+
+    # One colour scale for all panels, so the single colorbar applies to each
+    zs = [z_db[columns.index((area, production_group))] for area in areas]
+    zrange = np.percentile(np.stack(zs), [1, 99])
+
+    for i, (area, z) in enumerate(zip(areas, zs), start=1):
+        fig.add_trace(spectrogram_heatmap(f, t_dates, z, showscale=i == 1, zrange=zrange), row=i, col=1)
+        fig.update_yaxes(title_text="1/hour", row=i, col=1)
+
+    fig.update_layout(
+        title=f"Spectrogram of {production_group} Production by Price Area",
+        height=250 * len(areas)
+    )
+
+    return fig
+
+
+# Multi-resolution pyramid: (window length, hop) per level, finest first.
+# The heatmap sent to the browser is kept below MAX_COLS x MAX_ROWS cells.
+PYRAMID_LEVELS = [(64, 32), (256, 128), (1024, 512), (4096, 2048)]
+MAX_COLS = 600
+MAX_ROWS = 128
+
+
+def pool_frequencies(f, z_db, max_rows=MAX_ROWS):
+    """Average neighbouring frequency bins (in linear power) down to max_rows."""
+    k = int(np.ceil(len(f) / max_rows))
+    if k <= 1:
+        return f, z_db
+
+    n = len(f) // k * k
+    f_pooled = f[:n].reshape(-1, k).mean(axis=1)
+    power = 10 ** (z_db[:, :n] / 10)
+    power = power.reshape(z_db.shape[0], -1, k, z_db.shape[-1]).mean(axis=2)
+    return f_pooled, 10 * np.log10(power)
+
+
+@st.cache_data(ttl=6000)
+def spectrogram_pyramid(_df, key="2021-2024"):
+    """
+    Batched spectrograms of the whole period at every pyramid level.
+    The frame is not hashed; key identifies the data range.
+    """
+    levels = []
+    for window_length, hop in PYRAMID_LEVELS:
+        columns, f, t_dates, z_db = batched_spectrograms(_df, key, window_length, window_length - hop)
+        f, z_db = pool_frequencies(f, z_db)
+        levels.append({
+            "window_length": window_length,
+            "hop": hop,
+            "columns": columns,
+            "f": f,
+            "t_dates": t_dates,
+            "z_db": z_db,
+        })
+    return levels
+
+
+def pick_level(levels, start, end, max_cols=MAX_COLS):
+    """
+    Finest level with at most max_cols segments in [start, end]. If even the
+    coarsest level has more, its segments are strided down to max_cols.
+
+    Returns:
+      The level and an index array of the segments to show.
+    """
+    for level in levels:
+        idx = np.flatnonzero((level["t_dates"] >= start) & (level["t_dates"] <= end))
+        if len(idx) <= max_cols:
+            return level, idx
+
+    step = int(np.ceil(len(idx) / max_cols))
+    return level, idx[::step]
+
+
+def plot_spectrogram_zoom(df, price_area, production_group, start, end):
+    levels = spectrogram_pyramid(df)
+    level, idx = pick_level(levels, start, end)
+
+    if (price_area, production_group) not in level["columns"] or len(idx) == 0:
+        return None, level
+
+    z = level["z_db"][level["columns"].index((price_area, production_group))][:, idx]
+
+    fig = go.Figure(data=spectrogram_heatmap(level["f"], level["t_dates"][idx], z))
+    fig.update_layout(
+        title=(f"Spectrogram of {production_group} Production ({price_area}) – "
+               f"window {level['window_length']}h, hop {level['hop']}h"),
+        xaxis_title="Time",
+        yaxis_title="Frequency [1/hour]",
+        height=600
+    )
+    return fig, level
+
+
 elhub_df, df_consumption = st.session_state["mongo_data"]
-elhub_df = elhub_df[elhub_df["starttime"].dt.year == 2021]
+selected_year = (start_year, end_year)
+elhub_df = elhub_df[elhub_df["starttime"].dt.year.between(start_year, end_year)]
+
+# Robust STL on a single year is precomputed in the background. For longer
+# ranges it is too slow to run for every combination, so it only runs on demand.
+if start_year == end_year:
+    # Fit the selected combination first, then the rest
+    submit_stl(production_series(elhub_df, selected_area, selected_group),
+               stl_key(selected_area, selected_group, selected_year, STL_PARAMS), STL_PARAMS)
+    precompute_stl(elhub_df, selected_year)
 
 
 with tab1:
     st.header("STL Analysis")
-    
-    fig = stl_decomposition(elhub_df, price_area=selected_area, production_group=selected_group)
 
-    st.plotly_chart(fig, use_container_width=True)
+    engine = st.radio(
+        "Decomposition engine",
+        ["Fast preview", "Robust STL"],
+        index=0 if start_year != end_year else 1,
+        horizontal=True,
+        help="Fast preview uses a moving-average trend and hourly seasonal means. "
+             "Robust STL is exact but slow on multi-year data."
+    )
+
+    zoomable_chart(
+        lambda x_range: stl_decomposition(elhub_df, price_area=selected_area, production_group=selected_group,
+                                          year=selected_year, fast=engine == "Fast preview", x_range=x_range),
+        production_series(elhub_df, selected_area, selected_group).index,
+        key=f"stl_zoom_{selected_area}_{selected_group}_{start_year}_{end_year}"
+    )
+
+    fast_res = fast_decomposition(production_series(elhub_df, selected_area, selected_group))
+    robust_res = cached_stl(selected_area, selected_group, selected_year)
+
+    m1, m2 = st.columns(2)
+    m1.metric("Fast preview", f"{fast_res.attrs['elapsed']:.3f} s")
+    m2.metric("Robust STL", f"{robust_res.attrs['elapsed']:.2f} s" if robust_res is not None else "not computed")
+
+    if start_year == end_year:
+        done = stl_progress(selected_year)
+        total = len(price_areas) * len(production_groups)
+        st.caption(f"Precomputed STL decompositions: {done}/{total}")
 
 
 with tab2:
     st.header("Spectrogram Analysis")
 
-    fig = plot_spectrogram(elhub_df, price_area=selected_area, production_group=selected_group)
-    
-    st.plotly_chart(fig, use_container_width=True)
+    spectro_mode = st.radio("View", ["Selected years", "Compare all price areas", "Zoomable 2021–2024"],
+                            horizontal=True)
+
+    if spectro_mode == "Zoomable 2021–2024":
+        full_df = st.session_state["mongo_data"][0]
+        t_min = full_df["starttime"].min().to_pydatetime()
+        t_max = full_df["starttime"].max().to_pydatetime()
+        visible = st.slider("Visible time range", min_value=t_min, max_value=t_max,
+                            value=(t_min, t_max), format="YYYY-MM-DD")
+
+        fig, level = plot_spectrogram_zoom(full_df, selected_area, selected_group,
+                                           pd.Timestamp(visible[0]), pd.Timestamp(visible[1]))
+        st.caption(f"Pyramid level: window {level['window_length']}h, hop {level['hop']}h")
+    elif spectro_mode == "Compare all price areas":
+        fig = plot_spectrogram_areas(elhub_df, production_group=selected_group, year=selected_year)
+    else:
+        fig = plot_spectrogram(elhub_df, price_area=selected_area, production_group=selected_group,
+                               year=selected_year)
+
+    if fig is None:
+        st.warning(f"No {selected_group} production data for the selection.")
+    else:
+        st.plotly_chart(fig, use_container_width=True)
     
 
 
@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
+from plot_utils import line_trace
 
 st.set_page_config(page_title="Plots", layout="wide")
 
@@ -22,9 +23,9 @@ def plot_single_column(column, df):
 
     # Temperature
     if column == "temperature_2m (°C)":
-        fig = go.Figure(go.Scatter(
-            x=df["time"],
-            y=df[column],
+        fig = go.Figure(line_trace(
+            df["time"],
+            df[column],
             mode="lines",
             line=dict(color="red"),
             connectgaps=True,
@@ -38,9 +39,9 @@ def plot_single_column(column, df):
 
     # Precipitation 
     if column == "precipitation (mm)":
-        fig = go.Figure(go.Scatter(
-            x=df["time"],
-            y=df[column],
+        fig = go.Figure(line_trace(
+            df["time"],
+            df[column],
             mode="lines",
             line=dict(color="#01386a"),
             connectgaps=True,
@@ -54,9 +55,9 @@ def plot_single_column(column, df):
 
     # Wind Speed
     if column == "wind_speed_10m (m/s)":
-        fig = go.Figure(go.Scatter(
-            x=df["time"],
-            y=df[column],
+        fig = go.Figure(line_trace(
+            df["time"],
+            df[column],
             mode="lines",
             line=dict(color="#75bbfd"),
             connectgaps=True,
@@ -70,9 +71,9 @@ def plot_single_column(column, df):
 
     # Wind Gusts
     if column == "wind_gusts_10m (m/s)":
-        fig = go.Figure(go.Scatter(
-            x=df["time"],
-            y=df[column],
+        fig = go.Figure(line_trace(
+            df["time"],
+            df[column],
             mode="lines",
             line=dict(color="#7af9ab"),
             connectgaps=True,
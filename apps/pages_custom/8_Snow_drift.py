@@ -73,6 +73,13 @@ def compute_snow_transport(T, F, theta, Swe, hourly_wind_speeds, dt=3600):
          Control: Process controlling the transport (wind or snowfall).
     """
     Qupot = compute_Qupot(hourly_wind_speeds, dt)
+    return snow_transport_from_totals(T, F, theta, Swe, Qupot)
+
+def snow_transport_from_totals(T, F, theta, Swe, Qupot):
+    """
+    Same as compute_snow_transport, but starting from an already summed
+    Qupot (kg/m) instead of the hourly wind speeds.
+    """
     Qspot = 0.5 * T * Swe  # Snowfall-limited transport [kg/m]
     Srwe = theta * Swe    # Relocated water equivalent [mm]
     
@@ -95,6 +102,132 @@ def compute_snow_transport(T, F, theta, Swe, hourly_wind_speeds, dt=3600):
     }
 
 
+# Streaming accumulator ----------------------------------
+
+# The accumulator is a plain dict holding running sums for one location and
+# one July-June season. Memory does not grow with the number of hours: only
+# the totals, the 16 sectors and at most 12 monthly rows are kept.
+
+def new_accumulator(season_start_year):
+    """
+    Create an empty streaming accumulator for the season starting
+    1 July of season_start_year.
+    """
+    return {
+        "season": f"{season_start_year}-{season_start_year+1}",
+        "last_time": None,
+        "Qupot": 0.0,
+        "Swe": 0.0,
+        "sectors": [0.0] * 16,
+        "months": {},  # "YYYY-MM" -> {"Qupot": ..., "Swe": ..., "sectors": [...]}
+    }
+
+def update_accumulator(acc, time, temperature, precipitation, wind_speed, wind_dir, dt=3600):
+    """
+    Add one hour of weather to the accumulator.
+
+    Hours at or before the last processed hour and hours with missing
+    values are ignored, so the same data can safely be fed again.
+
+    Returns:
+      True if the hour was added, False otherwise.
+    """
+    if acc["last_time"] is not None and time <= acc["last_time"]:
+        return False
+    if any(pd.isna(v) for v in (temperature, precipitation, wind_speed, wind_dir)):
+        return False
+
+    q = ((wind_speed ** 3.8) * dt) / 233847
+    swe = precipitation if temperature < 1 else 0.0
+    idx = sector_index(wind_dir)
+
+    key = f"{time.year}-{time.month:02d}"
+    month = acc["months"].setdefault(key, {"Qupot": 0.0, "Swe": 0.0, "sectors": [0.0] * 16})
+
+    for target in (acc, month):
+        target["Qupot"] += q
+        target["Swe"] += swe
+        target["sectors"][idx] += q
+
+    acc["last_time"] = time
+    return True
+
+def feed_accumulator(acc, df, dt=3600):
+    """
+    Feed all new hourly rows of an Open-Meteo dataframe into the accumulator.
+
+    Returns:
+      Number of hours added.
+    """
+    new = df[df["time"] > acc["last_time"]] if acc["last_time"] is not None else df
+    added = 0
+    for row in new.itertuples(index=False):
+        added += update_accumulator(
+            acc, row.time, row.temperature_2m, row.precipitation,
+            row.wind_speed_10m, row.wind_direction_10m, dt
+        )
+    return added
+
+def pending_range(acc, season_start_year):
+    """
+    Dates to download for the hours the accumulator has not seen yet: from
+    the day of the next hour to the end of the season or today, whichever
+    comes first.
+
+    Returns:
+      (start_date, end_date) as "YYYY-MM-DD", or None if the season is done.
+    """
+    season_start = pd.Timestamp(f"{season_start_year}-07-01")
+    season_end = pd.Timestamp(f"{season_start_year+1}-06-30")
+
+    start = season_start if acc["last_time"] is None else (acc["last_time"] + pd.Timedelta(hours=1)).normalize()
+    end = min(season_end, pd.Timestamp.now(tz="Europe/Oslo").tz_localize(None).normalize())
+    if start > end:
+        return None
+    return f"{start:%Y-%m-%d}", f"{end:%Y-%m-%d}"
+
+def accumulator_result(acc, T, F, theta):
+    """
+    Snow transport for the season so far, in the same format as
+    compute_snow_transport.
+    """
+    return snow_transport_from_totals(T, F, theta, acc["Swe"], acc["Qupot"])
+
+CURVE_COLUMNS = ["Month", "Qupot (kg/m)", "Swe (mm)", "Qt (kg/m)",
+                 "Cumulative Qupot (kg/m)", "Cumulative Swe (mm)", "Cumulative Qt (kg/m)"]
+
+def accumulator_curves(acc, T, F, theta):
+    """
+    Monthly and cumulative curves within the season.
+
+    The monthly Qt is computed from that month's own Qupot and Swe, and the
+    cumulative Qt adds up the monthly values. Qt is not additive (the
+    controlling process can switch, and Qinf jumps when it does), so the
+    cumulative Qt can differ from the Qt of the whole season.
+
+    Returns:
+      A dataframe with one row per month (no rows before any data).
+    """
+    rows = []
+    cum_qupot, cum_swe, cum_qt = 0.0, 0.0, 0.0
+    for key in sorted(acc["months"]):
+        month = acc["months"][key]
+        qt = snow_transport_from_totals(T, F, theta, month["Swe"], month["Qupot"])["Qt (kg/m)"]
+        cum_qupot += month["Qupot"]
+        cum_swe += month["Swe"]
+        cum_qt += qt
+        rows.append({
+            "Month": key,
+            "Qupot (kg/m)": month["Qupot"],
+            "Swe (mm)": month["Swe"],
+            "Qt (kg/m)": qt,
+            "Cumulative Qupot (kg/m)": cum_qupot,
+            "Cumulative Swe (mm)": cum_swe,
+            "Cumulative Qt (kg/m)": cum_qt,
+        })
+    return pd.DataFrame(rows, columns=CURVE_COLUMNS)
+
+
 def plot_rose(avg_sector_values, overall_avg):
     """
     Plot a 16-sector wind-rose using Plotly instead of Matplotlib.
@@ -150,8 +283,9 @@ def plot_rose(avg_sector_values, overall_avg):
 
 # Open-Meteo API data 
 
-# Caching data to avoid reloading on every interaction
-@st.cache_data
+# Caching data to avoid reloading on every interaction. The ttl lets the
+# current season pick up hours published since the last download.
+@st.cache_data(ttl=3600)
 def load_data_from_api(lat, lon, start_date, end_date, variables=["temperature_2m", "precipitation", "wind_speed_10m", "wind_gusts_10m", "wind_direction_10m"]):
     url = f"https://archive-api.open-meteo.com/v1/era5?latitude={lat}&longitude={lon}&start_date={start_date}&end_date={end_date}&hourly="
     for var in variables:
@@ -210,31 +344,30 @@ theta = 0.5   # Relocation coefficient
 results = []
 sector_values = []
 
+# Accumulators survive reruns, so only the hours after the last processed
+# one are downloaded and processed. A finished season is never downloaded
+# again.
+if "snow_drift_accumulators" not in st.session_state:
+    st.session_state["snow_drift_accumulators"] = {}
+accumulators = st.session_state["snow_drift_accumulators"]
+
 for year in range(start_year, end_year+1):
-    start_date = f"{year}-07-01"
-    end_date = f"{year+1}-06-30"
+    acc = accumulators.setdefault((lat, lon, year), new_accumulator(year))
 
-    df = load_data_from_api(lat, lon, start_date, end_date)
+    dates = pending_range(acc, year)
+    if dates is not None:
+        df = load_data_from_api(lat, lon, *dates)
+        if not df.empty:
+            feed_accumulator(acc, df)
 
-    if df.empty:
+    if acc["last_time"] is None:
         continue
-    
-    df["Swe_hourly"] = df.apply(
-        lambda row: row["precipitation"] if row["temperature_2m"] < 1 else 0,
-        axis=1
-    )
-
-    Swe_total = df["Swe_hourly"].sum()
-    ws = df["wind_speed_10m"].tolist()
-    wd = df["wind_direction_10m"].tolist()
 
-    result = compute_snow_transport(T, F, theta, Swe_total, ws)
+    result = accumulator_result(acc, T, F, theta)
     Qt = result["Qt (kg/m)"]
 
-    sec = compute_sector_transport(ws, wd)
-
     results.append({"Season": f"{year}-{year+1}", "Qt (kg/m)": Qt})
-    sector_values.append(sec)
+    sector_values.append(acc["sectors"])
 
 
 # Show results -------------------------------------------
@@ -277,5 +410,54 @@ with c2:
     st.plotly_chart(fig_rose, use_container_width=True)
 
 
+# Intra-season breakdown ---------------------------------
+
+st.subheader("Intra-season Breakdown")
+
+season = st.selectbox("Select season", df_results["Season"].tolist(), index=len(df_results) - 1)
+season_year = int(season.split("-")[0])
+acc = accumulators[(lat, lon, season_year)]
+
+df_curves = accumulator_curves(acc, T, F, theta)
+st.caption(f"Data processed up to {acc['last_time']}. Monthly Qt uses each month's own wind and "
+           "snowfall; Qt is not additive, so the monthly values need not sum to the season's Qt.")
+
+c3, c4 = st.columns(2)
+
+with c3:
+    fig_month = go.Figure()
+    fig_month.add_trace(go.Bar(
+        x=df_curves["Month"],
+        y=df_curves["Qt (kg/m)"],
+        name="Monthly Qt"
+    ))
+    fig_month.update_layout(
+        title=f"Monthly Snow Drift {season}",
+        xaxis_title="Month",
+        yaxis_title="Qt (kg/m)"
+    )
+    st.plotly_chart(fig_month, use_container_width=True)
 
+with c4:
+    fig_cum = go.Figure()
+    fig_cum.add_trace(go.Scatter(
+        x=df_curves["Month"],
+        y=df_curves["Cumulative Qt (kg/m)"],
+        mode="lines+markers",
+        name="Cumulative Qt"
+    ))
+    fig_cum.add_trace(go.Scatter(
+        x=df_curves["Month"],
+        y=df_curves["Cumulative Qupot (kg/m)"],
+        mode="lines+markers",
+        name="Cumulative Qupot",
+        line=dict(dash="dash")
+    ))
+    fig_cum.update_layout(
+        title=f"Cumulative Snow Drift {season}",
+        xaxis_title="Month",
+        yaxis_title="kg/m"
+    )
+    st.plotly_chart(fig_cum, use_container_width=True)
 
+st.dataframe(df_curves, use_container_width=True)
@@ -7,6 +7,7 @@ import requests
 import tomllib
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
+from plot_utils import line_trace, visible_slice, zoomable_chart, ZOOM_POINTS
 
 
 st.set_page_config(page_title="Sliding Window Correlation")
@@ -83,6 +84,29 @@ def load_weather(lat, lon, year, var):
     return df
 
 
+meteo_vars = ["temperature_2m", "precipitation", "wind_speed_10m",
+              "wind_gusts_10m", "wind_direction_10m"]
+
+@st.cache_data(ttl=6000)
+def load_weather_all(lat, lon, year):
+    """All meteorological variables for one location and year, indexed by time."""
+    url = (
+        f"https://archive-api.open-meteo.com/v1/era5?"
+        f"latitude={lat}&longitude={lon}"
+        f"&start_date={year}-01-01&end_date={year}-12-31"
+        f"&hourly={','.join(meteo_vars)}&timezone=Europe%2FOslo"
+    )
+
+    r = requests.get(url)
+    if r.status_code != 200:
+        st.error("Failed to load meteorological data")
+        return None
+
+    df = pd.DataFrame(r.json()["hourly"])
+    df["time"] = pd.to_datetime(df["time"])
+    return df.set_index("time")
+
+
 # ---------------------------------------------------------------------
 # USER CONTROLS
 # ---------------------------------------------------------------------
@@ -124,13 +148,21 @@ with c1:
 
     met_var = st.selectbox(
         "Meteorological variable:",
-        ["temperature_2m", "precipitation", "wind_speed_10m",
-         "wind_gusts_10m", "wind_direction_10m"]
+        meteo_vars
     )
 
 with c2:
-    window = st.slider("Sliding Window Size (hours)", 24, 720, 168)
-    lag = st.slider("Lag (hours)", -168, 168, 0)
+    view = st.radio("View", ["Single lag", "All lags (heatmap)", "All window sizes", "Batch matrix",
+                             "Zoomable 2021–2024"],
+                    horizontal=True)
+    window = st.slider("Sliding Window Size (hours)", 24, 720, 168,
+                       disabled=view == "All window sizes")
+    lag = st.slider("Lag (hours)", -168, 168, 0, disabled=view == "All lags (heatmap)")
+    nan_aware = st.checkbox(
+        "NaN-aware windows",
+        value=False,
+        help="Skip missing hours inside a window instead of leaving the whole window empty."
+    )
 
 
 # ---------------------------------------------------------------------
@@ -172,37 +204,300 @@ df_merged["meteo_lagged"] = df_merged["meteo"].shift(lag)
 
 max_idx = max(0, len(df_merged) - 1)
 
-center = st.slider(
-    "Center Index Highlight",
-    0,
-    max_idx,
-    max_idx // 2 if max_idx > 0 else 0
-)
+if view == "Single lag":
+    center = st.slider(
+        "Center Index Highlight",
+        0,
+        max_idx,
+        max_idx // 2 if max_idx > 0 else 0
+    )
 
 
 # ---------------------------------------------------------------------
-# SLIDING WINDOW CORRELATION PLOT
+# ROLLING CORRELATION KERNEL (PREFIX SUMS)
 # ---------------------------------------------------------------------
+def prefix_sums(x, y):
+    """
+    Cumulative sums of n, x, y, x², y² and xy with a leading zero, so the sum
+    over any window [start, end) is S[end] - S[start].
+
+    Only pairs where both x and y are present are counted. Both series are
+    centred on their mean first, which keeps the sums small and avoids
+    cancellation when the variance is computed from them.
+
+    x and y may be 2-D (e.g. one row per lag); time is always the last axis
+    and the result has shape (6, ..., n + 1).
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+    valid = ~(np.isnan(x) | np.isnan(y))
+    if valid.any():
+        x = x - x[valid].mean()
+        y = y - y[valid].mean()
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    terms = np.stack([valid.astype(float), x, y, x * x, y * y, x * y])
+    S = np.zeros(terms.shape[:-1] + (terms.shape[-1] + 1,))
+    np.cumsum(terms, axis=-1, out=S[..., 1:])
+    return S
+
+
+def corr_from_sums(S, start, end, min_periods):
+    """
+    Pearson correlation for the windows [start, end) using prefix sums from
+    prefix_sums. start and end can be scalars or arrays.
+
+    Windows with fewer than min_periods valid pairs, or with zero variance,
+    give NaN.
+    """
+    n, sx, sy, sxx, syy, sxy = S[..., end] - S[..., start]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+
+    # Treat variances at rounding level as zero (constant series)
+    eps = 1e-12
+    bad = (n < min_periods) | (var_x <= eps * sxx) | (var_y <= eps * syy)
+    return np.where(bad, np.nan, np.clip(r, -1.0, 1.0))
+
+
+def window_bounds(n, window, center=True):
+    """
+    Start/end index of the window for each position, same convention as
+    pandas rolling (window ending at the position, or centred with
+    window // 2 points before it). Windows are clipped to the series.
+    """
+    pos = np.arange(n)
+    start = pos - window // 2 if center else pos - window + 1
+    end = start + window
+    return np.clip(start, 0, n), np.clip(end, 0, n)
+
+
+def rolling_corr(x, y, window, center=True, nan_aware=False, min_periods=None, S=None):
+    """
+    Rolling correlation of x and y in one pass over prefix sums.
+
+    With nan_aware=False this matches pandas
+    x.rolling(window, center=center).corr(y): a window must be complete and
+    contain no missing values. With nan_aware=True missing pairs are
+    skipped and a window needs at least min_periods valid pairs
+    (default: half the window).
+    """
+    if S is None:
+        S = prefix_sums(x, y)
+    if min_periods is None:
+        min_periods = max(2, window // 2) if nan_aware else window
+
+    start, end = window_bounds(S.shape[-1] - 1, window, center)
+    return corr_from_sums(S, start, end, min_periods)
+
+
+def lag_matrix(y, lags):
+    """
+    Stack shifted copies of y, one row per lag. Row i equals
+    pd.Series(y).shift(lags[i]), with NaN where the shift runs off the series.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    idx = np.arange(n)[None, :] - np.asarray(lags)[:, None]
+    inside = (idx >= 0) & (idx < n)
+    return np.where(inside, y[np.clip(idx, 0, max(n - 1, 0))], np.nan)
+
+
+@st.cache_data(ttl=6000)
+def lag_time_corr(x, y, lags, window, nan_aware=False):
+    """
+    Centred rolling correlation between x and y shifted by every lag,
+    computed in one batched pass over stacked prefix sums.
+
+    Returns:
+      Array of shape (len(lags), len(x)).
+    """
+    Y = lag_matrix(y, lags)
+    S = prefix_sums(np.asarray(x, dtype=float)[None, :], Y)
+    return rolling_corr(None, None, window, center=True, nan_aware=nan_aware, S=S)
+
+
+# Window sizes for the multi-scale view (hours)
+WINDOW_LADDER = [24, 48, 72, 120, 168, 240, 336, 504, 720]
+
+
+@st.cache_data(ttl=6000)
+def cached_prefix_sums(x, y):
+    """Prefix sums for one (area, year, variable, month, lag) selection."""
+    return prefix_sums(x, y)
+
+
+@st.cache_data(ttl=6000)
+def multiscale_corr(S, windows, nan_aware=False):
+    """
+    Centred rolling correlation for every window size in windows, all taken
+    from the same prefix sums.
+
+    Returns:
+      Array of shape (len(windows), n).
+    """
+    n = S.shape[-1] - 1
+    bounds = [window_bounds(n, w, center=True) for w in windows]
+    start = np.stack([b[0] for b in bounds])
+    end = np.stack([b[1] for b in bounds])
+
+    windows = np.asarray(windows)[:, None]
+    min_periods = np.maximum(2, windows // 2) if nan_aware else windows
+    return corr_from_sums(S, start, end, min_periods)
+
+
+def pairwise_corr(X, Y, min_periods=2):
+    """
+    Correlation of every column of X (n × G) with every column of Y, using
+    only rows where both values are present (like DataFrame.corr).
+
+    Y may be stacked as (L, n, V), e.g. one slice per lag; all slices are
+    handled by the same batched matrix products and the result has shape
+    (L, G, V) (or (G, V) for a 2-D Y).
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+
+    Mx = ~np.isnan(X)
+    My = ~np.isnan(Y)
+    # Centre columns first to keep the sums small
+    Xf = np.where(Mx, X - np.nanmean(X, axis=0), 0.0)
+    Yf = np.where(My, Y - np.nanmean(Y, axis=-2, keepdims=True), 0.0)
+    Mx = Mx.astype(float)
+    My = My.astype(float)
+
+    n = Mx.T @ My
+    sx = Xf.T @ My
+    sy = Mx.T @ Yf
+    sxx = (Xf * Xf).T @ My
+    syy = Mx.T @ (Yf * Yf)
+    sxy = Xf.T @ Yf
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+
+    eps = 1e-12
+    bad = (n < min_periods) | (var_x <= eps * sxx) | (var_y <= eps * syy)
+    return np.where(bad, np.nan, np.clip(r, -1.0, 1.0)), n
+
+
+def energy_wide(df, group_col, area, year):
+    """Hourly energy per group for one price area and year, one column per group."""
+    data = df[(df["pricearea"] == area) & (df["starttime"].dt.year == year)]
+    return (
+        data.groupby(["starttime", group_col])["quantitykwh"].sum()
+        .unstack(group_col)
+        .sort_index()
+    )
+
+
+@st.cache_data(ttl=6000)
+def batch_corr_matrix(_df_production, _df_consumption, year, month, lags):
+    """
+    Correlation between every energy group and every meteorological variable
+    in every price area for one year (and optionally one month).
+
+    The weather is shifted over the whole year before the period is cut out,
+    so lagged values at the start of a month come from the previous month.
+    The energy frames are not hashed; the cache is keyed on year, month and
+    lags only.
+
+    Returns:
+      A long dataframe with one row per (area, dataset, group, variable, lag).
+    """
+    lags = np.asarray(lags)
+    rows = []
+
+    for area, (lat, lon) in area_coords.items():
+        weather = load_weather_all(lat, lon, year)
+        if weather is None:
+            continue
+        weather = weather[~weather.index.duplicated()]
+
+        for dataset, df, group_col in (
+            ("production", _df_production, "productiongroup"),
+            ("consumption", _df_consumption, "consumptiongroup"),
+        ):
+            wide = energy_wide(df, group_col, area, year)
+            if wide.empty:
+                continue
+
+            # Align weather to the energy index once, then stack all lags
+            aligned = weather[meteo_vars].reindex(
+                pd.date_range(wide.index.min(), wide.index.max(), freq="h")
+            )
+            wide = wide.reindex(aligned.index)
+
+            Y = np.stack([aligned.shift(int(l)).to_numpy() for l in lags])
+            X = wide.to_numpy()
+
+            if month is not None:
+                keep = aligned.index.month == month
+                X = X[keep]
+                Y = Y[:, keep]
+
+            r, n = pairwise_corr(X, Y)
+
+            L, G, V = r.shape
+            rows.append(pd.DataFrame({
+                "Price area": area,
+                "Dataset": dataset,
+                "Group": np.tile(np.repeat(wide.columns.to_numpy(), V), L),
+                "Meteo variable": np.tile(meteo_vars, L * G),
+                "Lag (h)": np.repeat(lags, G * V),
+                "Correlation": r.ravel(),
+                "Hours": n.ravel().astype(int),
+            }))
+
+    if not rows:
+        return pd.DataFrame()
+    return pd.concat(rows, ignore_index=True)
+
+
+def best_lag(corr, lags):
+    """
+    Lag with the strongest absolute correlation for each window, and that
+    correlation. Windows without any valid value give NaN.
+    """
+    lags = np.asarray(lags)
+    has_value = ~np.all(np.isnan(corr), axis=0)
+    idx = np.argmax(np.where(np.isnan(corr), -np.inf, np.abs(corr)), axis=0)
+    cols = np.arange(corr.shape[1])
+    lag_best = np.where(has_value, lags[idx], np.nan)
+    corr_best = np.where(has_value, corr[idx, cols], np.nan)
+    return lag_best, corr_best
+
+
 # ---------------------------------------------------------------------
-# SLIDING WINDOW CORRELATION PLOT (UPDATED)
+# SLIDING WINDOW CORRELATION PLOT
 # ---------------------------------------------------------------------
 
-def plot_swc(df, lag, window, center):
+def plot_swc(df, lag, window, center, nan_aware=False):
     energy = df["quantitykwh"]
     meteo_lagged = df["meteo_lagged"]
 
-    # Rolling correlation
-    swc = energy.rolling(window=window, center=True).corr(meteo_lagged)
+    # Rolling correlation from prefix sums
+    S = prefix_sums(energy, meteo_lagged)
+    swc = pd.Series(
+        rolling_corr(energy, meteo_lagged, window, center=True, nan_aware=nan_aware, S=S),
+        index=df.index
+    )
 
-    # Calculate correlation in the highlighted window
+    # Correlation in the highlighted window, from the same sums
     w_start = max(0, center - window // 2)
     w_end = min(len(df), center + window // 2)
 
     if w_end > w_start:
-        corr_window = np.corrcoef(
-            energy.iloc[w_start:w_end],
-            meteo_lagged.iloc[w_start:w_end]
-        )[0, 1]
+        min_periods = 2 if nan_aware else w_end - w_start
+        corr_window = float(corr_from_sums(S, w_start, w_end, min_periods))
     else:
         corr_window = np.nan
 
@@ -221,14 +516,14 @@ def plot_swc(df, lag, window, center):
     # 1. Meteorology plot
     # ------------------------------------------------------
     fig.add_trace(
-        go.Scatter(x=df["time"], y=df["meteo_lagged"], mode="lines", name="Meteo (lagged)"),
+        line_trace(df["time"], df["meteo_lagged"], mode="lines", name="Meteo (lagged)"),
         row=1, col=1
     )
 
     fig.add_trace(
-        go.Scatter(
-            x=df["time"].iloc[w_start:w_end],
-            y=df["meteo_lagged"].iloc[w_start:w_end],
+        line_trace(
+            df["time"].iloc[w_start:w_end],
+            df["meteo_lagged"].iloc[w_start:w_end],
             mode="lines",
             line=dict(color="red", width=3),
             name="Window (Meteo)"
@@ -240,14 +535,14 @@ def plot_swc(df, lag, window, center):
     # 2. Energy plot
     # ------------------------------------------------------
     fig.add_trace(
-        go.Scatter(x=df["time"], y=energy, mode="lines", name="Energy"),
+        line_trace(df["time"], energy, mode="lines", name="Energy"),
         row=2, col=1
     )
 
     fig.add_trace(
-        go.Scatter(
-            x=df["time"].iloc[w_start:w_end],
-            y=energy.iloc[w_start:w_end],
+        line_trace(
+            df["time"].iloc[w_start:w_end],
+            energy.iloc[w_start:w_end],
             mode="lines",
             line=dict(color="red", width=3),
             name="Window (Energy)"
@@ -259,7 +554,7 @@ def plot_swc(df, lag, window, center):
     # 3. SWC plot
     # ------------------------------------------------------
     fig.add_trace(
-        go.Scatter(x=df["time"], y=swc, mode="lines", name="Rolling Corr"),
+        line_trace(df["time"], swc, mode="lines", name="Rolling Corr"),
         row=3, col=1
     )
 
@@ -281,10 +576,246 @@ def plot_swc(df, lag, window, center):
     return fig, corr_window
 
 
-# Generate updated plot
-fig, corr_window = plot_swc(df_merged, lag, window, center)
+def plot_lag_heatmap(df, lags, corr):
+    lag_best, corr_best = best_lag(corr, lags)
+
+    fig = go.Figure()
+
+    fig.add_trace(go.Heatmap(
+        x=df["time"],
+        y=lags,
+        z=corr,
+        colorscale="RdBu",
+        zmin=-1,
+        zmax=1,
+        colorbar=dict(title="Correlation")
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=df["time"],
+        y=lag_best,
+        mode="markers",
+        marker=dict(color="black", size=3),
+        name="Best lag",
+        customdata=corr_best,
+        hovertemplate="%{x}<br>Best lag: %{y}h<br>Corr: %{customdata:.3f}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        title=f"Sliding Window Correlation by Lag: {met_var} vs {energy_var}",
+        xaxis_title="Time",
+        yaxis_title="Lag (hours)",
+        height=700,
+        showlegend=False
+    )
+
+    return fig, lag_best, corr_best
+
+
+def plot_multiscale(df, windows, corr, selected_window):
+    row = windows.index(selected_window)
+
+    fig = make_subplots(
+        rows=2,
+        cols=1,
+        shared_xaxes=True,
+        row_heights=[0.65, 0.35],
+        vertical_spacing=0.08,
+        subplot_titles=(
+            "Correlation by Window Size",
+            f"Rolling Correlation ({selected_window}h window)"
+        )
+    )
+
+    fig.add_trace(
+        go.Heatmap(
+            x=df["time"],
+            y=[str(w) for w in windows],
+            z=corr,
+            colorscale="RdBu",
+            zmin=-1,
+            zmax=1,
+            colorbar=dict(title="Correlation", len=0.6, y=0.7)
+        ),
+        row=1, col=1
+    )
+
+    fig.add_trace(
+        line_trace(df["time"], corr[row], mode="lines", name="Rolling Corr"),
+        row=2, col=1
+    )
+
+    fig.update_yaxes(title_text="Window (hours)", type="category", row=1, col=1)
+    fig.update_yaxes(range=[-1, 1], row=2, col=1)
+    fig.update_layout(height=800, showlegend=False)
 
-st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-st.info(f"**Correlation in selected window (lag = {lag}h): {corr_window:.3f}**")
+
+# ---------------------------------------------------------------------
+# ZOOMABLE 2021–2024 VIEW
+# ---------------------------------------------------------------------
+LONG_RANGE_YEARS = [2021, 2022, 2023, 2024]
+
+
+@st.cache_data(ttl=6000)
+def load_long_range(_df_energy, energy_var, area, var):
+    """
+    One meteorological variable and the total energy of one price area for
+    all years, on a single sorted hourly index. The energy frame is not
+    hashed; the cache is keyed on energy_var, area and variable.
+    """
+    lat, lon = area_coords[area]
+    frames = [load_weather(lat, lon, year, var) for year in LONG_RANGE_YEARS]
+    weather = pd.concat([f for f in frames if f is not None]).drop_duplicates("time").set_index("time")["meteo"]
+
+    data = _df_energy[_df_energy["pricearea"] == area]
+    energy = data.groupby("starttime")["quantitykwh"].sum()
+
+    index = pd.date_range(min(weather.index.min(), energy.index.min()),
+                          max(weather.index.max(), energy.index.max()), freq="h", name="time")
+    return pd.DataFrame({"meteo": weather.reindex(index), "quantitykwh": energy.reindex(index)})
+
+
+def plot_swc_range(df, swc, lag, x_range):
+    """Meteo, energy and rolling correlation for the visible part of the long series."""
+    sl = visible_slice(df.index, x_range)
+    part = df.iloc[sl]
+
+    fig = make_subplots(
+        rows=3,
+        cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.06,
+        subplot_titles=(
+            f"{met_var} (lagged {lag}h)",
+            f"{energy_var} (kWh)",
+            "Sliding Window Correlation"
+        )
+    )
+
+    fig.add_trace(
+        line_trace(part.index, part["meteo_lagged"], max_points=ZOOM_POINTS, mode="lines", name="Meteo (lagged)"),
+        row=1, col=1
+    )
+    fig.add_trace(
+        line_trace(part.index, part["quantitykwh"], max_points=ZOOM_POINTS, mode="lines", name="Energy"),
+        row=2, col=1
+    )
+    fig.add_trace(
+        line_trace(part.index, swc[sl], max_points=ZOOM_POINTS, mode="lines", name="Rolling Corr"),
+        row=3, col=1
+    )
+
+    fig.update_yaxes(range=[-1, 1], row=3, col=1)
+    fig.update_layout(height=1000, showlegend=False)
+
+    return fig
+
+
+if view == "Single lag":
+    # Generate updated plot
+    fig, corr_window = plot_swc(df_merged, lag, window, center, nan_aware=nan_aware)
+
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.info(f"**Correlation in selected window (lag = {lag}h): {corr_window:.3f}**")
+
+elif view == "Zoomable 2021–2024":
+    st.caption("All years at once; the year and month settings are not used in this view.")
+
+    df_long = load_long_range(df_energy_raw, energy_var, selected_area, met_var)
+    df_long["meteo_lagged"] = df_long["meteo"].shift(lag)
+
+    swc = rolling_corr(
+        df_long["quantitykwh"].to_numpy(),
+        df_long["meteo_lagged"].to_numpy(),
+        window,
+        nan_aware=nan_aware
+    )
+
+    zoomable_chart(
+        lambda x_range: plot_swc_range(df_long, swc, lag, x_range),
+        df_long.index,
+        key=f"swc_zoom_{selected_area}_{energy_var}_{met_var}"
+    )
+
+elif view == "All window sizes":
+    S = cached_prefix_sums(
+        df_merged["quantitykwh"].to_numpy(),
+        df_merged["meteo_lagged"].to_numpy()
+    )
+    corr = multiscale_corr(S, WINDOW_LADDER, nan_aware)
+
+    selected_window = st.select_slider("Highlight window size (hours)", WINDOW_LADDER, value=168)
+
+    fig = plot_multiscale(df_merged, WINDOW_LADDER, corr, selected_window)
+    st.plotly_chart(fig, use_container_width=True)
+
+elif view == "Batch matrix":
+    st.subheader("Batch Correlation Matrix")
+
+    b1, b2 = st.columns(2)
+    with b1:
+        batch_month = st.selectbox(
+            "Period",
+            options=[None] + list(month_names.keys()),
+            format_func=lambda x: f"Whole {selected_year}" if x is None else month_names[x]
+        )
+    with b2:
+        lag_min, lag_max = st.slider("Lag range (hours)", -168, 168, (0, 0))
+        lag_step = st.number_input("Lag step (hours)", 1, 168, 6)
+
+    batch_lags = tuple(range(lag_min, lag_max + 1, int(lag_step)))
+
+    df_batch = batch_corr_matrix(df_production, df_consumption, selected_year, batch_month, batch_lags)
+
+    if df_batch.empty:
+        st.warning("No data available for the selected period.")
+        st.stop()
+
+    # Keep the strongest lag for each combination
+    df_batch["|Correlation|"] = df_batch["Correlation"].abs()
+    df_best = (
+        df_batch.dropna(subset=["Correlation"])
+        .sort_values("|Correlation|", ascending=False)
+        .drop_duplicates(["Price area", "Dataset", "Group", "Meteo variable"])
+        .reset_index(drop=True)
+    )
+
+    matrix = df_best.pivot_table(
+        index=["Price area", "Dataset", "Group"],
+        columns="Meteo variable",
+        values="Correlation"
+    ).reindex(columns=meteo_vars)
+
+    st.dataframe(
+        matrix.style.background_gradient(cmap="RdBu", vmin=-1, vmax=1).format("{:.3f}"),
+        use_container_width=True
+    )
+
+    st.subheader("Strongest Drivers")
+    st.dataframe(df_best, use_container_width=True, hide_index=True)
+
+else:
+    lags = np.arange(-168, 169)
+    corr = lag_time_corr(
+        df_merged["quantitykwh"].to_numpy(),
+        df_merged["meteo"].to_numpy(),
+        lags,
+        window,
+        nan_aware
+    )
+
+    fig, lag_best, corr_best = plot_lag_heatmap(df_merged, lags, corr)
+    st.plotly_chart(fig, use_container_width=True)
+
+    if np.isnan(corr_best).all():
+        st.warning("No complete windows for the selected month and window size.")
+    else:
+        i = np.nanargmax(np.abs(corr_best))
+        st.info(
+            f"**Strongest correlation: {corr_best[i]:.3f} at lag {int(lag_best[i])}h "
+            f"(window centred on {df_merged['time'].iloc[i]})**"
+        )
 
@@ -0,0 +1,135 @@
+# apps/plot_utils.py
+#
+# Level-of-detail helpers for long hourly Plotly line traces, shared by the
+# pages. A long series is cut into equal bins and only the minimum and the
+# maximum of each bin are sent to the browser, so peaks and outliers stay
+# visible while a trace holds about as many points as the chart has pixels.
+# Traces that still have many points are drawn with WebGL.
+#
+# zoomable_chart() adds server-side zoom: a box drawn on the chart selects
+# an x-range, and the figure is rebuilt from the full-resolution data in
+# that range, again limited to about ZOOM_POINTS points per trace.
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+
+MAX_POINTS = 2000        # two points per bin, roughly one bin per pixel column
+WEBGL_THRESHOLD = 5000   # larger traces use go.Scattergl
+ZOOM_POINTS = 2000       # points per trace for a zoomed-in range
+
+
+def minmax_indices(y, n_bins):
+    """
+    Sorted positions of the minimum and maximum of each of n_bins equal bins
+    of y, plus the first and last position. NaNs are ignored; a bin that is
+    all NaN keeps one NaN so a line still breaks over the gap.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    size = -(-n // n_bins)
+    n_bins = -(-n // size)
+    pad = n_bins * size - n
+
+    finite = np.isfinite(y)
+    low = np.pad(np.where(finite, y, np.inf), (0, pad), constant_values=np.inf).reshape(n_bins, size)
+    high = np.pad(np.where(finite, y, -np.inf), (0, pad), constant_values=-np.inf).reshape(n_bins, size)
+
+    offsets = np.arange(n_bins) * size
+    idx = np.concatenate([offsets + low.argmin(axis=1), offsets + high.argmax(axis=1), [0, n - 1]])
+    return np.unique(idx[idx < n])
+
+
+def decimate(x, y, max_points=MAX_POINTS):
+    """x and y reduced to at most max_points points; short series are returned as they are."""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if len(y) <= max_points:
+        return x, y
+
+    idx = minmax_indices(y, max(1, max_points // 2))
+    return x[idx], y[idx]
+
+
+def line_trace(x, y, max_points=MAX_POINTS, **kwargs):
+    """
+    Scatter trace for a long series, decimated to max_points (pass None to
+    keep every point, e.g. for outlier markers). Uses go.Scattergl when the
+    trace still has more than WEBGL_THRESHOLD points.
+    """
+    if max_points:
+        x, y = decimate(x, y, max_points)
+
+    trace = go.Scattergl if len(y) > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+# Zoom-driven resampling ---------------------------------------------------
+
+def visible_slice(index, x_range):
+    """Positions of a sorted DatetimeIndex inside x_range = (start, end); everything when None."""
+    if x_range is None:
+        return slice(None)
+    start = index.searchsorted(x_range[0], side="left")
+    end = index.searchsorted(x_range[1], side="right")
+    return slice(start, end)
+
+
+def zoom_range(event, index):
+    """x-range of the latest box selection in a st.plotly_chart event, in the time zone of index."""
+    try:
+        boxes = event.selection["box"]
+    except (AttributeError, KeyError, TypeError):
+        return None
+    if not boxes:
+        return None
+
+    bounds = sorted(pd.Timestamp(x) for x in boxes[-1]["x"])
+    if index.tz is not None:
+        bounds = [b.tz_localize(index.tz) if b.tz is None else b.tz_convert(index.tz) for b in bounds]
+    return tuple(bounds)
+
+
+def zoomable_chart(make_figure, index, key):
+    """
+    Show a chart that is rebuilt for the x-range of a box selection.
+
+    Parameters:
+      make_figure: callable make_figure(x_range) returning the figure for a
+        (start, end) range, or for all data when x_range is None
+      index: sorted DatetimeIndex of the plotted data
+      key: session state key; use one per dataset so ranges don't carry over
+
+    make_figure should cut its data with visible_slice and build the traces
+    with line_trace(..., max_points=ZOOM_POINTS).
+    """
+    state = st.session_state.setdefault(key, {"range": None, "chart": 0})
+
+    # A range without data (e.g. after the data changed) shows everything
+    sl = visible_slice(index, state["range"])
+    if state["range"] is not None and len(index[sl]) < 2:
+        state["range"] = None
+        state["chart"] += 1
+
+    fig = make_figure(state["range"])
+    fig.update_layout(dragmode="select")
+    event = st.plotly_chart(fig, use_container_width=True, on_select="rerun",
+                            selection_mode="box", key=f"{key}_chart_{state['chart']}")
+
+    new_range = zoom_range(event, index)
+    if new_range is not None and new_range != state["range"]:
+        state["range"] = new_range
+        st.rerun()
+
+    if state["range"] is None:
+        st.caption("Draw a box on the chart to zoom in at full resolution.")
+    else:
+        start, end = state["range"]
+        st.caption(f"Showing {start:%Y-%m-%d %H:%M} – {end:%Y-%m-%d %H:%M}. Draw a box to zoom further.")
+        if st.button("Reset zoom", key=f"{key}_reset"):
+            # A new chart key drops the old selection
+            state["range"] = None
+            state["chart"] += 1
+            st.rerun()